@@ -0,0 +1,247 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import *
+from schemas import *
+from database import get_async_db, get_async_read_db
+from stock import reserve_stock_statement, release_stock_statement
+from baskets import add_product_to_basket, add_products_to_basket, checkout_basket, parse_expand, basket_view_statement, basket_view
+from catalog_cache import catalog_cache, bump_catalog_version
+from serialization import rows_response, rows_to_dicts, PRODUCT_COLUMNS, BASKET_ITEM_COLUMNS
+from pagination import paginate, set_next_cursor, sort_column, PRODUCT_SORTS
+from search import search_products
+from dependencies import CurrentUser, get_current_basket_async, invalidate_current_user
+from datetime import date
+
+# async versions of the product and basket routes, mounted under /async in main.py
+router = APIRouter()
+
+async def get_product_or_404(db: AsyncSession, product_id: int):
+    db_product = await db.get(Product, product_id)
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return db_product
+
+@router.get("/products", response_model=list[ProductOut])
+async def read_products(request: Request, skip: int = 0, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", db: AsyncSession = Depends(get_async_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    column = sort_column(PRODUCT_SORTS, sort)
+    products = (await db.execute(paginate(select(*PRODUCT_COLUMNS), Product.id, column, sort, skip, limit, cursor))).all()
+    headers = {}
+    set_next_cursor(headers, products, sort, limit)
+    return catalog_cache.store(request, version, rows_to_dicts(products), headers)
+
+@router.get("/products/search", response_model=list[ProductSearchResult])
+async def search_catalog(request: Request, q: str, limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_async_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    return catalog_cache.store(request, version, await db.run_sync(search_products, q, limit))
+
+# get product by full name, price and expiration date
+@router.get("/products/{name}/{price}/{expiration_date}", response_model=ProductOut)
+async def read_product_by_name_price_expiration_date(request: Request, name: str, price: float, expiration_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    result = await db.execute(select(*PRODUCT_COLUMNS).filter(Product.name == name, Product.price == price, Product.expiration_date == expiration_date))
+    product = result.first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return catalog_cache.store(request, version, product._asdict())
+
+@router.get("/products/{product_id}", response_model=ProductOut)
+async def read_product(request: Request, product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    product = (await db.execute(select(*PRODUCT_COLUMNS).filter(Product.id == product_id))).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return catalog_cache.store(request, version, product._asdict())
+
+@router.post("/products", response_model=ProductOut)
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Product).filter(Product.name == product.name, Product.expiration_date == product.expiration_date))
+    if result.scalars().first():
+        raise HTTPException(status_code=400, detail="Product already registered")
+    new_product = Product(**product.dict())
+    db.add(new_product)
+    await db.commit()
+    bump_catalog_version()
+    await db.refresh(new_product)
+    return new_product
+
+@router.put("/products/{product_id}", response_model=ProductOut)
+async def update_product(product_id: int, product: ProductUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_product = await get_product_or_404(db, product_id)
+    for key, value in product.dict().items():
+        setattr(db_product, key, value)
+    await db.commit()
+    bump_catalog_version()
+    await db.refresh(db_product)
+    return db_product
+
+# increase stock of a product
+@router.put("/products/{product_id}/stock/increase", response_model=ProductOut)
+async def increase_stock(product_id: int, stock: StockUpdate, db: AsyncSession = Depends(get_async_db)):
+    if (await db.execute(release_stock_statement(product_id, stock.stock))).rowcount != 1:
+        raise HTTPException(status_code=404, detail="Product not found")
+    await db.commit()
+    bump_catalog_version()
+    return await db.get(Product, product_id, populate_existing=True)
+
+# decrease stock of a product
+@router.put("/products/{product_id}/stock/decrease", response_model=ProductOut)
+async def decrease_stock(product_id: int, stock: StockUpdate, db: AsyncSession = Depends(get_async_db)):
+    if (await db.execute(reserve_stock_statement(product_id, stock.stock))).rowcount != 1:
+        await db.rollback()
+        await get_product_or_404(db, product_id)
+        raise HTTPException(status_code=400, detail="Not enough stock available")
+    await db.commit()
+    bump_catalog_version()
+    return await db.get(Product, product_id, populate_existing=True)
+
+@router.delete("/products/{product_id}")
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_product = await get_product_or_404(db, product_id)
+    await db.delete(db_product)
+    await db.commit()
+    bump_catalog_version()
+    return {"msg": "Product deleted"}
+
+@router.post("/basket", response_model=BasketOut)
+async def create_basket(basket: BasketCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Basket).filter(Basket.user_id == basket.user_id))
+    if result.scalars().first():
+        raise HTTPException(status_code=400, detail="Basket already exists")
+
+    user = await db.get(User, basket.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    new_basket = Basket(**basket.dict())
+    db.add(new_basket)
+    await db.commit()
+    await db.refresh(new_basket)
+    invalidate_current_user(user.username)
+    return new_basket
+
+@router.get("/basket")
+async def read_basket(expand: Optional[str] = None, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_read_db)):
+    if not expand:
+        basket = await db.get(Basket, current.basket_id)
+        if not basket:
+            raise HTTPException(status_code=404, detail="Basket not found")
+        return basket
+    fields = parse_expand(expand)
+    basket = (await db.execute(basket_view_statement(current.basket_id, fields))).unique().scalars().first()
+    if not basket:
+        raise HTTPException(status_code=404, detail="Basket not found")
+    return basket_view(basket, fields)
+
+@router.put("/basket", response_model=BasketOut)
+async def update_basket(basket: BasketUpdate, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    db_basket = await db.get(Basket, current.basket_id)
+    for key, value in basket.dict().items():
+        setattr(db_basket, key, value)
+    await db.commit()
+    await db.refresh(db_basket)
+    # the basket may have moved to another user
+    invalidate_current_user()
+    return db_basket
+
+@router.delete("/basket")
+async def delete_basket(current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    db_basket = await db.get(Basket, current.basket_id)
+    await db.delete(db_basket)
+    await db.commit()
+    invalidate_current_user(current.username)
+    return {"msg": "Basket deleted"}
+
+@router.get("/basket/items", response_model=list[BasketItemOut])
+async def read_basket_items(current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_read_db)):
+    result = await db.execute(select(*BASKET_ITEM_COLUMNS).filter(BasketItem.basket_id == current.basket_id))
+    return rows_response(result.all())
+
+@router.put("/basket/items/{item_id}", response_model=BasketItemOut)
+async def update_basket_item(item_id: int, item: BasketItemUpdate, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(BasketItem).filter(BasketItem.id == item_id, BasketItem.basket_id == current.basket_id))
+    db_item = result.scalars().first()
+    if not db_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    for key, value in item.dict().items():
+        setattr(db_item, key, value)
+    await db.commit()
+    await db.refresh(db_item)
+    return db_item
+
+@router.post("/basket/items", response_model=BasketItemOut)
+async def add_basket_item(item: BasketItemCreate, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    db_product = await get_product_or_404(db, item.product_id)
+    return await db.run_sync(lambda session: add_product_to_basket(session, current.basket_id, db_product, item.quantity))
+
+@router.post("/basket/checkout")
+async def checkout(current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(checkout_basket, current.user_id, current.basket_id)
+
+@router.post("/basket/items/batch", response_model=BasketWithItemsOut)
+async def add_basket_items_batch(items: list[BasketBatchItem], current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(add_products_to_basket, current.basket_id, items)
+
+# add basket item by name, price and expiration date, getting basket id from token
+@router.post("/basket/items/{name}/{price}/{expiration_date}", response_model=BasketItemOut)
+async def add_basket_item_by_name_price_expiration_date(
+    name: str,
+    price: float,
+    expiration_date: date,
+    request: BasketItemRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current: CurrentUser = Depends(get_current_basket_async)
+):
+    result = await db.execute(select(Product).filter(Product.name == name, Product.price == price, Product.expiration_date == expiration_date))
+    db_product = result.scalars().first()
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await db.run_sync(lambda session: add_product_to_basket(session, current.basket_id, db_product, request.quantity))
+
+@router.delete("/basket/items/{item_id}")
+async def delete_basket_item(item_id: int, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    db_item = await db.get(BasketItem, item_id)
+    if not db_item or db_item.basket_id != current.basket_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    await db.execute(release_stock_statement(db_item.product_id, db_item.quantity))
+    db_basket = await db.get(Basket, current.basket_id)
+    db_basket.total_price -= db_item.total_price
+    db_basket.quantity -= db_item.quantity
+    await db.delete(db_item)
+    await db.commit()
+    bump_catalog_version()
+    return {"msg": "Item deleted"}
+
+# remove n items from basket (n as link parameter)
+@router.put("/basket/items/{item_id}/remove/{quantity}", response_model=BasketItemOut)
+async def remove_basket_item(item_id: int, quantity: int, current: CurrentUser = Depends(get_current_basket_async), db: AsyncSession = Depends(get_async_db)):
+    db_item = await db.get(BasketItem, item_id)
+    if not db_item or db_item.basket_id != current.basket_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+    db_product = await get_product_or_404(db, db_item.product_id)
+
+    await db.execute(release_stock_statement(db_product.id, quantity))
+    db_item.quantity -= quantity
+    db_item.total_price -= db_product.price * quantity
+    db_basket = await db.get(Basket, current.basket_id)
+    db_basket.total_price -= db_product.price * quantity
+    db_basket.quantity -= quantity
+    await db.commit()
+    bump_catalog_version()
+    await db.refresh(db_item)
+    return db_item
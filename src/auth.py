@@ -1,15 +1,33 @@
+import hashlib
+import os
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from typing import Optional
 from fastapi import HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from cache import TTLCache
+from hashing import hash_pool
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 4096))
+# changing it rehashes each user's password on their next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+# OAuth2PasswordBearer is used to get the token from the Authorization header
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # Password hashingls
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -17,6 +35,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# (valid, new hash or None when the stored one already uses BCRYPT_ROUNDS)
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# the same, run in the hashing process pool
+async def get_password_hash_async(password: str) -> str:
+    return await hash_pool.run(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    return await hash_pool.run(verify_and_update_password, plain_password, hashed_password)
+
 # JWT Token functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -28,14 +57,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+# verified claims by sha256 of the token, each entry lives until the token's exp
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+
+def token_cache_stats() -> dict:
+    return {"hits": token_cache.hits, "misses": token_cache.misses, "size": len(token_cache), "maxsize": token_cache.maxsize}
+
+def verify_token(token: str, use_cache: bool = True):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    key = hashlib.sha256(token.encode()).digest()
+    if use_cache:
+        payload = token_cache.get(key)
+        if payload is not None:
+            return dict(payload)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+    if use_cache and "exp" in payload:
+        ttl = payload["exp"] - time.time()
+        if ttl > 0:
+            token_cache.set(key, payload, ttl=ttl)
+    return dict(payload)
\ No newline at end of file
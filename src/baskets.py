@@ -0,0 +1,189 @@
+from collections import defaultdict
+from fastapi import HTTPException
+from sqlalchemy import delete, or_, select, tuple_, update
+from sqlalchemy.orm import Session, joinedload
+from models import Product, Basket, BasketItem, Order, OrderLine
+from schemas import BasketBatchItem
+from stock import reserve_stock
+from catalog_cache import bump_catalog_version
+from recommendations import invalidate_recommendations
+
+# basket operations shared by the sync routes and, through run_sync, the async ones
+
+# the basket's totals are bumped in SQL, so the basket row is never loaded
+def add_to_basket_totals_statement(basket_id: int, quantity: int, price: float):
+    return (
+        update(Basket)
+        .where(Basket.id == basket_id)
+        .values(quantity=Basket.quantity + quantity, total_price=Basket.total_price + price)
+    )
+
+def add_product_to_basket(db: Session, basket_id: int, db_product: Product, quantity: int):
+    db_item = db.query(BasketItem).filter(BasketItem.basket_id == basket_id, BasketItem.product_id == db_product.id).first()
+    # take the stock only after all the reads, the write lock is held until commit
+    if not reserve_stock(db, db_product.id, quantity):
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Not enough stock available")
+
+    db.execute(add_to_basket_totals_statement(basket_id, quantity, db_product.price * quantity))
+    # if item already exists in the basket, update the quantity and total price of basket item
+    if db_item:
+        db_item.quantity += quantity
+        db_item.total_price += db_product.price * quantity
+    else:
+        db_item = BasketItem(basket_id=basket_id, product_id=db_product.id, quantity=quantity, total_price=db_product.price * quantity)
+        db.add(db_item)
+    db.commit()
+    bump_catalog_version()
+    db.refresh(db_item)
+    return db_item
+
+BASKET_EXPANSIONS = {"items", "products"}
+
+def parse_expand(expand: str) -> set:
+    fields = {field.strip() for field in expand.split(",") if field.strip()}
+    unknown = fields - BASKET_EXPANSIONS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown expand field(s): {', '.join(sorted(unknown))}")
+    # products hang off the items
+    if "products" in fields:
+        fields.add("items")
+    return fields
+
+# basket, its items and their products in a single joined SELECT
+def basket_view_statement(basket_id: int, fields: set):
+    statement = select(Basket).filter(Basket.id == basket_id)
+    if "products" in fields:
+        statement = statement.options(joinedload(Basket.items).joinedload(BasketItem.product))
+    elif "items" in fields:
+        statement = statement.options(joinedload(Basket.items))
+    return statement
+
+def _columns(row) -> dict:
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+def basket_view(basket: Basket, fields: set) -> dict:
+    view = _columns(basket)
+    if "items" in fields:
+        view["items"] = []
+        for item in basket.items:
+            item_view = _columns(item)
+            if "products" in fields:
+                item_view["product"] = _columns(item.product) if item.product else None
+            view["items"].append(item_view)
+    return view
+
+def _resolve_products(db: Session, entries: list[BasketBatchItem]) -> dict:
+    ids = {entry.product_id for entry in entries if entry.product_id is not None}
+    keys = {(entry.name, entry.price, entry.expiration_date) for entry in entries if entry.product_id is None}
+    conditions = []
+    if ids:
+        conditions.append(Product.id.in_(list(ids)))
+    if keys:
+        conditions.append(tuple_(Product.name, Product.price, Product.expiration_date).in_(list(keys)))
+    products = db.query(Product).filter(or_(*conditions)).all()
+
+    by_id = {product.id: product for product in products}
+    by_key = {(product.name, product.price, product.expiration_date): product for product in products}
+    resolved, missing = {}, []
+    for index, entry in enumerate(entries):
+        if entry.product_id is not None:
+            product = by_id.get(entry.product_id)
+        else:
+            product = by_key.get((entry.name, entry.price, entry.expiration_date))
+        if product is None:
+            missing.append(index)
+        resolved[index] = product
+    if missing:
+        raise HTTPException(status_code=404, detail={"msg": "Product not found", "items": missing})
+    return resolved
+
+# add many lines to a basket in a single transaction: one IN query for the
+# products, one for the existing basket lines and one commit
+def add_products_to_basket(db: Session, basket_id: int, entries: list[BasketBatchItem]):
+    if not entries:
+        raise HTTPException(status_code=400, detail="No items given")
+    resolved = _resolve_products(db, entries)
+
+    quantities = defaultdict(int)
+    products = {}
+    for index, entry in enumerate(entries):
+        product = resolved[index]
+        quantities[product.id] += entry.quantity
+        products[product.id] = product
+
+    db_basket = db.get(Basket, basket_id)
+    existing = {
+        item.product_id: item
+        for item in db.query(BasketItem).filter(BasketItem.basket_id == basket_id, BasketItem.product_id.in_(list(quantities)))
+    }
+
+    short = [product_id for product_id, quantity in quantities.items() if not reserve_stock(db, product_id, quantity)]
+    if short:
+        db.rollback()
+        raise HTTPException(status_code=400, detail={"msg": "Not enough stock available", "product_ids": short})
+
+    for product_id, quantity in quantities.items():
+        product = products[product_id]
+        line_price = product.price * quantity
+        db_item = existing.get(product_id)
+        if db_item:
+            db_item.quantity += quantity
+            db_item.total_price += line_price
+        else:
+            db.add(BasketItem(basket_id=basket_id, product_id=product_id, quantity=quantity, total_price=line_price))
+        db_basket.total_price += line_price
+        db_basket.quantity += quantity
+    db.commit()
+    bump_catalog_version()
+    db.refresh(db_basket)
+
+    items = db.query(BasketItem).filter(BasketItem.basket_id == basket_id).all()
+    return {"basket": db_basket, "items": items}
+
+# turn the basket into an order in one transaction: order + order lines are
+# written, the basket lines deleted and the basket totals reset. Stock was
+# already taken when the items were added to the basket.
+def checkout_basket(db: Session, user_id: int, basket_id: int):
+    lines = (
+        db.query(BasketItem.product_id, Product.name, Product.price, BasketItem.quantity, BasketItem.total_price)
+        .join(Product, Product.id == BasketItem.product_id)
+        .filter(BasketItem.basket_id == basket_id)
+        .all()
+    )
+    if not lines:
+        raise HTTPException(status_code=400, detail="Basket is empty")
+
+    order = Order(
+        user_id=user_id,
+        quantity=sum(line.quantity for line in lines),
+        total_price=sum(line.total_price for line in lines),
+    )
+    db.add(order)
+    db.flush()
+    db.add_all([
+        OrderLine(order_id=order.id, product_id=line.product_id, quantity=line.quantity, unit_price=line.price, total_price=line.total_price)
+        for line in lines
+    ])
+    # a concurrent checkout of the same basket already took these lines
+    deleted = db.execute(delete(BasketItem).where(BasketItem.basket_id == basket_id).execution_options(synchronize_session=False)).rowcount
+    if deleted != len(lines):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Basket changed during checkout")
+    db_basket = db.get(Basket, basket_id)
+    db_basket.quantity = 0
+    db_basket.total_price = 0
+
+    receipt = {
+        "order_id": order.id,
+        "created_at": order.created_at,
+        "quantity": order.quantity,
+        "total_price": order.total_price,
+        "lines": [
+            {"product_id": line.product_id, "name": line.name, "quantity": line.quantity, "unit_price": line.price, "total_price": line.total_price}
+            for line in lines
+        ],
+    }
+    db.commit()
+    invalidate_recommendations(user_id)
+    return receipt
@@ -0,0 +1,157 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from typing import NamedTuple
+import numpy as np
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import User, Order, OrderLine, Product
+from recalg import REFERENCE_DATE, RECOMMENDED_RECIPES, expiry_bonus, load_catalog
+
+# Nightly recommendations for every user at once, scored like
+# /users/me/recommendations but as array operations.
+#
+# Purchases are a sparse user x product matrix P (summed quantity plus the
+# near-expiry bonus per order line) and the catalog a product x recipe
+# incidence matrix I, both kept as CSR arrays. Scores are P @ I plus the
+# recipes' base popularity, computed a block of users at a time so only
+# BLOCK_CELLS scores are dense at once, and each block's top k come from
+# argpartition. Blocks can be spread over a process pool.
+#
+# numpy only: the CSR product is a bincount over the expanded
+# (user, recipe) pairs, so scipy isn't needed.
+
+BLOCK_CELLS = 8_000_000
+FETCH_ROWS = 100_000
+
+class CSR(NamedTuple):
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+
+def load_purchases(db: Session):
+    # every user gets a row, so users with no orders still get the popular recipes
+    user_ids = np.fromiter(db.execute(select(User.id).order_by(User.id)).scalars(), dtype=np.int64)
+    statement = (
+        select(Order.user_id, OrderLine.product_id, func.sum(OrderLine.quantity), func.count(OrderLine.id))
+        .join(Order, Order.id == OrderLine.order_id)
+        .group_by(Order.user_id, OrderLine.product_id)
+        .order_by(Order.user_id)
+        .execution_options(yield_per=FETCH_ROWS)
+    )
+    chunks = [np.array(partition, dtype=np.int64).reshape(-1, 4) for partition in db.execute(statement).partitions()]
+    rows = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+    # orders of deleted users have no row to go to
+    rows = rows[np.isin(rows[:, 0], user_ids)]
+
+    product_ids, columns = np.unique(rows[:, 1], return_inverse=True)
+    found = db.execute(select(Product.id, Product.name, Product.expiration_date).where(Product.id.in_(product_ids.tolist())))
+    products = {id: (name, expiration_date) for id, name, expiration_date in found}
+    names, bonus = [], np.zeros(len(product_ids), dtype=np.float32)
+    for column, id in enumerate(product_ids.tolist()):
+        name, expiration_date = products.get(id, (None, None))
+        names.append(name)
+        if expiration_date:
+            bonus[column] = expiry_bonus(datetime.combine(expiration_date, time()), REFERENCE_DATE)
+
+    points = rows[:, 2].astype(np.float32) + rows[:, 3] * bonus[columns]
+    counts = np.bincount(np.searchsorted(user_ids, rows[:, 0]), minlength=len(user_ids))
+    indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return user_ids, CSR(indptr, columns.astype(np.int32), points), names
+
+def incidence_matrix(names: list, catalog) -> CSR:
+    recipes = [catalog.by_ingredient.get(name, []) for name in names]
+    counts = np.fromiter((len(r) for r in recipes), dtype=np.int64, count=len(recipes))
+    indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    indices = np.fromiter((index for r in recipes for index in r), dtype=np.int32, count=int(indptr[-1]))
+    return CSR(indptr, indices, np.ones(len(indices), dtype=np.float32))
+
+# gather the [start, end) ranges of a CSR's indices/data for the given rows
+def _expand(indptr: np.ndarray, rows: np.ndarray):
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+def score_block(purchases: CSR, incidence: CSR, popularity: np.ndarray, start: int, stop: int) -> np.ndarray:
+    recipes = len(popularity)
+    first, last = purchases.indptr[start], purchases.indptr[stop]
+    users = np.repeat(np.arange(stop - start), np.diff(purchases.indptr[start:stop + 1]))
+    products = purchases.indices[first:last]
+    points = purchases.data[first:last]
+    entry, positions = _expand(incidence.indptr, products)
+    cells = users[entry] * recipes + incidence.indices[positions]
+    scores = np.bincount(cells, weights=points[entry], minlength=(stop - start) * recipes)
+    return scores.reshape(stop - start, recipes) + popularity
+
+def top_k(scores: np.ndarray, k: int):
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+def score_users(purchases: CSR, incidence: CSR, popularity: np.ndarray, k: int, start: int, stop: int):
+    block = max(1, BLOCK_CELLS // max(1, len(popularity)))
+    indices, scores = [], []
+    for low in range(start, stop, block):
+        top, top_scores = top_k(score_block(purchases, incidence, popularity, low, min(stop, low + block)), k)
+        indices.append(top)
+        scores.append(top_scores)
+    if not indices:
+        return np.empty((0, k), dtype=np.int64), np.empty((0, k))
+    return np.concatenate(indices), np.concatenate(scores)
+
+def _rows(matrix: CSR, start: int, stop: int) -> CSR:
+    first, last = matrix.indptr[start], matrix.indptr[stop]
+    return CSR(matrix.indptr[start:stop + 1] - first, matrix.indices[first:last], matrix.data[first:last])
+
+def recommend_all(purchases: CSR, incidence: CSR, popularity: np.ndarray, k: int = RECOMMENDED_RECIPES, workers: int = 0):
+    users = len(purchases.indptr) - 1
+    if workers <= 1 or users < 2:
+        return score_users(purchases, incidence, popularity, k, 0, users)
+    bounds = np.linspace(0, users, workers + 1, dtype=np.int64).tolist()
+    # each worker only gets its own users' rows
+    shards = [_rows(purchases, start, stop) for start, stop in zip(bounds, bounds[1:])]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(score_users, shard, incidence, popularity, k, 0, len(shard.indptr) - 1) for shard in shards]
+        shards = [future.result() for future in futures]
+    return np.concatenate([top for top, _ in shards]), np.concatenate([scores for _, scores in shards])
+
+def write_ndjson(path: str, user_ids: np.ndarray, top: np.ndarray, scores: np.ndarray, catalog):
+    names = [recipe['name'] for recipe in catalog.recipes]
+    with open(path, "wb") as file:
+        for user_id, recipes, recipe_scores in zip(user_ids.tolist(), top.tolist(), scores.tolist()):
+            file.write(orjson.dumps({
+                "user_id": user_id,
+                "recipes": [{"name": names[r], "score": s} for r, s in zip(recipes, recipe_scores)],
+            }) + b"\n")
+
+if __name__ == "__main__":
+    import argparse
+    from sqlalchemy import create_engine
+    from database import DATABASE_URL
+    from recommendations import RECIPES_FILE
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", nargs="?", default="recommendations.ndjson")
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--recipes", default=RECIPES_FILE)
+    parser.add_argument("-k", type=int, default=RECOMMENDED_RECIPES)
+    parser.add_argument("--workers", type=int, default=0, help="processes to shard users over, 0 for inline, -1 for one per core")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.recipes)
+    with Session(create_engine(args.url)) as db:
+        user_ids, purchases, names = load_purchases(db)
+    incidence = incidence_matrix(names, catalog)
+    popularity = np.array([recipe['popularity'] for recipe in catalog.recipes], dtype=np.float64)
+    top, scores = recommend_all(purchases, incidence, popularity, args.k, os.cpu_count() if args.workers < 0 else args.workers)
+    write_ndjson(args.output, user_ids, top, scores, catalog)
+    print(f"wrote top {args.k} of {len(popularity)} recipes for {len(user_ids)} users to {args.output}")
@@ -0,0 +1,85 @@
+# requests/sec of the sync routes vs the /async routes, in process against a
+# freshly seeded SQLite database. Every route picked here reaches the
+# database: basket reads and writes aren't cached, and /products gets a
+# different skip on every request so the catalog cache doesn't answer it.
+# run from src/: python -m benchmarks.async_vs_sync --route basket_items --requests 2000 --concurrency 50
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.seed import seed, username
+
+ROUTES = ("basket_items", "basket", "add_item", "products")
+
+
+def build_requests(route: str, args, tokens: list, rng: random.Random) -> list:
+    if route == "products":
+        # distinct URLs, so each one misses the catalog cache
+        skips = rng.sample(range(args.products), min(args.requests, args.products))
+        return [("GET", f"/products?limit=10&skip={skip}", {}) for skip in skips]
+    requests = []
+    for _ in range(args.requests):
+        headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+        if route == "add_item":
+            body = {"product_id": rng.randrange(args.products) + 1, "quantity": 1}
+            requests.append(("POST", "/basket/items", {"json": body, "headers": headers}))
+        else:
+            path = "/basket/items" if route == "basket_items" else "/basket?expand=items,products"
+            requests.append(("GET", path, {"headers": headers}))
+    return requests
+
+
+async def run(app, prefix: str, requests: list, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(method, path, kwargs):
+            async with sem:
+                response = await client.request(method, prefix + path, **kwargs)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(*request) for request in requests))
+        elapsed = time.perf_counter() - start
+    return len(requests) / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--route", choices=ROUTES, default="basket_items")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=10, help="items per basket")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async_vs_sync.db')}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    seed(url, users=args.users, products=args.products, baskets=args.users, items=args.items, seed_value=args.seed)
+    # the app picks its database up from the environment on import
+    from main import app
+    from auth import create_access_token
+    from database import dispose_async_engines
+
+    rng = random.Random(args.seed)
+    tokens = [create_access_token({"sub": username(i)}) for i in range(args.users)]
+    try:
+        sync_rps = await run(app, "", build_requests(args.route, args, tokens, rng), args.concurrency)
+        async_rps = await run(app, "/async", build_requests(args.route, args, tokens, rng), args.concurrency)
+    finally:
+        # httpx's ASGI transport doesn't run the app's lifespan
+        await dispose_async_engines()
+    print(f"sync:  {sync_rps:8.1f} req/s")
+    print(f"async: {async_rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
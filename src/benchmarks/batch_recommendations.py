@@ -0,0 +1,65 @@
+# nightly batch scoring on synthetic data: users x products purchases and a
+# recipe catalog, scored as arrays with top-k by argpartition. A sample of
+# users is checked against the per-user RecipeScorer; exits non-zero if any
+# top-k scores differ.
+# run from src/: python -m benchmarks.batch_recommendations --users 1000000 --recipes 10000 --workers 8
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from batch_recommendations import CSR, incidence_matrix, recommend_all
+from recalg import RecipeCatalog, RecipeScorer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--bought", type=int, default=30, help="distinct products per user")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--check", type=int, default=200, help="users compared with RecipeScorer")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names = [f"Product {i}" for i in range(args.products)]
+    picker = random.Random(0)
+    recipes = [
+        {"name": f"Recipe {i}", "ingredients": picker.sample(names, 6), "instructions": "", "popularity": picker.randrange(20)}
+        for i in range(args.recipes)
+    ]
+    catalog = RecipeCatalog(recipes, "bench")
+    popularity = np.array([recipe["popularity"] for recipe in recipes], dtype=np.float64)
+
+    start = time.perf_counter()
+    # popular products are bought more often
+    columns = np.minimum(rng.zipf(1.3, size=(args.users, args.bought)) - 1, args.products - 1).astype(np.int32)
+    columns.sort(axis=1)
+    points = rng.integers(1, 5, size=columns.shape).astype(np.float32)
+    indptr = np.arange(0, args.users * args.bought + 1, args.bought, dtype=np.int64)
+    purchases = CSR(indptr, columns.ravel(), points.ravel())
+    incidence = incidence_matrix(names, catalog)
+    print(f"built {args.users} x {args.products} purchases and {args.products} x {args.recipes} incidence "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    top, scores = recommend_all(purchases, incidence, popularity, args.k, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"scored {args.users} users x {args.recipes} recipes in {elapsed:.1f}s ({args.users / elapsed:.0f} users/s)")
+
+    for user in picker.sample(range(args.users), min(args.check, args.users)):
+        scorer = RecipeScorer(catalog)
+        for column, value in zip(columns[user].tolist(), points[user].tolist()):
+            scorer.add(names[column], value)
+        expected = [recipe["popularity"] for recipe in scorer.top(args.k)]
+        if not np.allclose(expected, scores[user]):
+            print(f"MISMATCH for user {user}: {expected} != {scores[user].tolist()}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# how many checkout lanes one backend process keeps up with. Each lane is an
+# asyncio task that loops: log in, create its basket, scan --items products
+# one POST /basket/items at a time, check out. Products are picked with Zipf
+# popularity (--zipf 0 is uniform), so a few hot SKUs run out of stock and
+# show up as stock errors. Reports end-to-end checkout latency, per-step
+# latencies and errors as JSON.
+# In process by default; --url drives a running instance instead (seed its
+# database first with python -m benchmarks.seed and pass the same counts).
+# run from src/: python -m benchmarks.checkout_lanes --lanes 32 --items 15 --duration 30 --zipf 1.1
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from benchmarks.report import current_commit, summarize
+from benchmarks.seed import PASSWORD, seed, username
+
+STEPS = ("login", "create_basket", "scan", "checkout")
+# responses a lane expects and carries on from, so they aren't errors
+EXPECTED = {("create_basket", 400, "Basket already exists")}
+
+
+class Zipf:
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.population = range(n)
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(n)))
+        self.rng = rng
+
+    def sample(self) -> int:
+        return self.rng.choices(self.population, cum_weights=self.cum_weights)[0]
+
+
+class Results:
+    def __init__(self):
+        self.checkouts = []
+        self.steps = defaultdict(list)
+        self.errors = Counter()
+        self.step_errors = Counter()
+
+    def error(self, step: str, response: httpx.Response):
+        detail = response.json().get("detail") if response.headers.get("content-type", "").startswith("application/json") else None
+        detail = detail if isinstance(detail, str) else ""
+        if (step, response.status_code, detail) in EXPECTED:
+            return
+        self.errors[f"{step} {response.status_code} {detail}".strip()] += 1
+        self.step_errors[step] += 1
+
+
+async def think(rng: random.Random, mean_ms: float):
+    if mean_ms > 0:
+        await asyncio.sleep(rng.expovariate(1000 / mean_ms))
+
+
+async def timed(results: Results, step: str, request):
+    start = time.perf_counter()
+    response = await request
+    results.steps[step].append(time.perf_counter() - start)
+    if response.status_code >= 400:
+        results.error(step, response)
+    return response
+
+
+async def lane(client: httpx.AsyncClient, lane_id: int, args, zipf: Zipf, rng: random.Random, deadline: float, results: Results):
+    credentials = {"username": username(lane_id), "password": PASSWORD}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await timed(results, "login", client.post("/login", json=credentials))
+        if response.status_code != 200:
+            await think(rng, args.checkout_think)
+            continue
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        me = await client.get("/users/me", headers=headers)
+        response = await timed(results, "create_basket", client.post("/basket", json={"user_id": me.json()["id"]}))
+        # the basket from the previous round is reused
+        if response.status_code not in (200, 400):
+            continue
+
+        scanned = 0
+        for _ in range(args.items):
+            await think(rng, args.scan_think)
+            body = {"product_id": zipf.sample() + 1, "quantity": 1}
+            response = await timed(results, "scan", client.post("/basket/items", json=body, headers=headers))
+            scanned += response.status_code == 200
+        if not scanned:
+            continue
+
+        response = await timed(results, "checkout", client.post("/basket/checkout", headers=headers))
+        if response.status_code == 200:
+            results.checkouts.append(time.perf_counter() - start)
+        await think(rng, args.checkout_think)
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    zipf = Zipf(args.products, args.zipf, rng)
+    results = Results()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60, limits=httpx.Limits(max_connections=args.lanes))
+        shutdown = None
+    else:
+        # the app picks its database up from the environment on import
+        from main import app
+        from hashing import hash_pool
+        from database import dispose_async_engines
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lanes")
+
+        # httpx's ASGI transport doesn't run the app's lifespan
+        async def shutdown():
+            hash_pool.shutdown()
+            await dispose_async_engines()
+
+    try:
+        async with client:
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(
+                lane(client, i, args, zipf, random.Random(args.seed + i + 1), deadline, results)
+                for i in range(args.lanes)
+            ))
+            elapsed = time.perf_counter() - start
+    finally:
+        if shutdown:
+            await shutdown()
+
+    checkout = summarize(results.checkouts, elapsed)
+    checkout["checkouts_per_minute"] = round(len(results.checkouts) / elapsed * 60, 1)
+    return {
+        "checkout": checkout,
+        "steps": {step: summarize(results.steps[step], elapsed, results.step_errors[step]) for step in STEPS},
+        "errors": dict(results.errors.most_common()),
+        "stock_errors": sum(n for key, n in results.errors.items() if "stock" in key.lower()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="drive a running instance instead of the app in process")
+    parser.add_argument("--db", help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="skip seeding")
+    parser.add_argument("--lanes", type=int, default=16)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--stock", type=int, default=200, help="starting stock of every product")
+    parser.add_argument("--items", type=int, default=15, help="items scanned per checkout")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--scan-think", type=float, default=300, help="mean ms between scans")
+    parser.add_argument("--checkout-think", type=float, default=2000, help="mean ms between customers")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew, 0 for uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+
+    seeded = None
+    if not args.url:
+        path = args.db or os.path.join(tempfile.mkdtemp(), "lanes.db")
+        url = f"sqlite:///{path}"
+        os.environ["DATABASE_URL"] = url
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        if not args.reuse:
+            seeded = seed(url, users=args.lanes, products=args.products, baskets=0, items=0, seed_value=args.seed, stock=args.stock)
+
+    report = {
+        "commit": current_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "seed": seeded,
+        **asyncio.run(run(args)),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# throughput and latency percentiles of the hot routes, driven in process
+# through httpx's ASGI transport against a freshly seeded SQLite database.
+# Prints one JSON document (per-route stats plus the commit and the config),
+# so runs can be saved and compared across commits.
+# run from src/: python -m benchmarks.hot_routes --products 100000 --requests 2000 --output before.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.report import current_commit, summarize
+from benchmarks.seed import PASSWORD, product_fields, seed, username
+
+ROUTES = ("login", "products", "product_by_name", "basket_items", "basket")
+
+
+def build_requests(route: str, count: int, args, tokens: list, rng: random.Random) -> list:
+    requests = []
+    if route == "products":
+        # a different page every time, so the lane measures the query and not the catalog cache
+        pages = range(max(1, args.products))
+        skips = iter(rng.sample(pages, count) if count <= len(pages) else [rng.choice(pages) for _ in range(count)])
+    for _ in range(count):
+        if route == "login":
+            body = {"username": username(rng.randrange(args.users)), "password": PASSWORD}
+            requests.append(("POST", "/login", {"json": body}))
+        elif route == "products":
+            requests.append(("GET", f"/products?limit=20&skip={next(skips)}", {}))
+        elif route == "product_by_name":
+            product = product_fields(rng.randrange(args.products))
+            requests.append(("GET", f"/products/{product['name']}/{product['price']}/{product['expiration_date']}", {}))
+        else:
+            path = "/basket/items" if route == "basket_items" else "/basket?expand=items,products"
+            requests.append(("GET", path, {"headers": {"Authorization": f"Bearer {rng.choice(tokens)}"}}))
+    return requests
+
+
+async def drive(client: httpx.AsyncClient, requests: list, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(method, url, kwargs):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in requests))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run(args) -> dict:
+    # the app picks its database up from the environment on import
+    from main import app
+    from auth import create_access_token
+    from hashing import hash_pool
+    from database import dispose_async_engines
+
+    rng = random.Random(args.seed)
+    tokens = [create_access_token({"sub": username(i)}) for i in range(min(args.baskets, args.users))]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for route in args.routes:
+                count = args.login_requests if route == "login" else args.requests
+                # one unmeasured pass to warm connections, caches and the hashing pool,
+                # with its own requests so the measured ones aren't already cached
+                await drive(client, build_requests(route, args.concurrency, args, tokens, rng), args.concurrency)
+                requests = build_requests(route, count, args, tokens, rng)
+                results[route] = await drive(client, requests, args.concurrency)
+    finally:
+        # httpx's ASGI transport doesn't run the app's lifespan
+        hash_pool.shutdown()
+        await dispose_async_engines()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="skip seeding and use --db as it is")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--baskets", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10, help="items per basket")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--login-requests", type=int, default=200, help="bcrypt makes /login much slower")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    seeded = None if args.reuse else seed(url, args.users, args.products, args.baskets, args.items, args.seed)
+
+    report = {
+        "commit": current_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "seed": seeded,
+        "routes": asyncio.run(run(args)),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# logins/sec through POST /login as the hashing pool grows, driven in process
+# against a seeded database, so the route's database handling is measured
+# along with the bcrypt work
+# run from src/: python -m benchmarks.login_throughput --logins 200 --max-workers 8
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.seed import PASSWORD, seed, username
+
+
+async def run(client: httpx.AsyncClient, hash_pool, workers: int, users: int, logins: int) -> float:
+    hash_pool.shutdown()
+    hash_pool.workers = workers
+    hash_pool.queue_limit = logins
+
+    async def login(i: int):
+        response = await client.post("/login", json={"username": username(i % users), "password": PASSWORD})
+        response.raise_for_status()
+
+    # start the worker processes outside the timed part
+    await asyncio.gather(*(login(i) for i in range(max(workers, 1))))
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login.db')}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    seed(url, users=args.users, products=0, baskets=0, items=0)
+    # the app picks its database up from the environment on import
+    from main import app
+    from hashing import hash_pool
+    from database import dispose_async_engines
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            print(f"inline:    {await run(client, hash_pool, 0, args.users, args.logins):7.1f} logins/s")
+            workers = 1
+            while workers <= args.max_workers:
+                print(f"{workers:2} workers: {await run(client, hash_pool, workers, args.users, args.logins):7.1f} logins/s")
+                workers *= 2
+    finally:
+        # httpx's ASGI transport doesn't run the app's lifespan
+        hash_pool.shutdown()
+        await dispose_async_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
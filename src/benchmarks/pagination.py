@@ -0,0 +1,74 @@
+# OFFSET vs keyset pagination: latency of page 1 and a deep page
+# run from src/: python -m benchmarks.pagination --products 200000 --page 10000
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Product
+from migrations import create_missing_indexes
+from pagination import paginate, encode_cursor, PRODUCT_SORTS
+
+
+def seed(engine, count: int):
+    start = date(2025, 1, 1)
+    rows = [
+        (f"Product {i:07d}", round(random.uniform(1, 100), 2), 100, start + timedelta(days=random.randrange(365)))
+        for i in range(count)
+    ]
+    connection = engine.raw_connection()
+    try:
+        connection.cursor().executemany(
+            "INSERT INTO products (name, price, stock, expiration_date) VALUES (?, ?, ?, ?)",
+            [(name, price, stock, expires.isoformat()) for name, price, stock, expires in rows],
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def timed(db, statement, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.execute(statement).scalars().all()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "pagination.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes(engine)
+    seed(engine, args.products)
+    Session = sessionmaker(bind=engine)
+
+    skip = (args.page - 1) * args.limit
+    with Session() as db:
+        for sort, column in PRODUCT_SORTS.items():
+            # the cursor a client would hold after walking to the page before
+            last = db.execute(paginate(select(Product), Product.id, column, sort, skip - 1, 1, None)).scalars().one()
+            cursor = encode_cursor(sort, getattr(last, sort), last.id)
+
+            first = timed(db, paginate(select(Product), Product.id, column, sort, 0, args.limit, None), args.repeat)
+            offset = timed(db, paginate(select(Product), Product.id, column, sort, skip, args.limit, None), args.repeat)
+            keyset = timed(db, paginate(select(Product), Product.id, column, sort, 0, args.limit, cursor), args.repeat)
+            print(f"sort={sort:16} page 1: {first:7.3f} ms  page {args.page} offset: {offset:7.3f} ms  "
+                  f"page {args.page} cursor: {keyset:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# statements needed to build GET /basket?expand=items,products, against the
+# N+1 of /basket/items followed by one /products/{id} per line. Exits
+# non-zero if the expanded view takes more than one query.
+# run from src/: python -m benchmarks.query_counts --items 50
+import argparse
+import sys
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Basket, BasketItem, Product, User
+from baskets import basket_view, basket_view_statement, parse_expand
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        user = User(username="bench", password="x")
+        db.add(user)
+        db.flush()
+        basket = Basket(user_id=user.id, quantity=args.items, total_price=args.items)
+        db.add(basket)
+        db.flush()
+        for i in range(args.items):
+            product = Product(name=f"Product {i}", price=1, stock=10)
+            db.add(product)
+            db.flush()
+            db.add(BasketItem(basket_id=basket.id, product_id=product.id, quantity=1, total_price=1))
+        db.commit()
+        basket_id = basket.id
+
+    counter = QueryCounter(engine)
+    with Session() as db:
+        fields = parse_expand("items,products")
+        view = basket_view(db.execute(basket_view_statement(basket_id, fields)).unique().scalars().one(), fields)
+    expanded = counter.count
+
+    counter.count = 0
+    with Session() as db:
+        items = db.query(BasketItem).filter(BasketItem.basket_id == basket_id).all()
+        for item in items:
+            db.query(Product).filter(Product.id == item.product_id).first()
+    n_plus_one = counter.count
+
+    print(f"expand=items,products: {expanded} queries for {len(view['items'])} items")
+    print(f"items + product per line: {n_plus_one} queries")
+    sys.exit(0 if expanded == 1 else 1)
+
+
+if __name__ == "__main__":
+    main()
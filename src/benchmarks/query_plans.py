@@ -0,0 +1,56 @@
+# EXPLAIN QUERY PLAN check for the hot lookups in main.py: exits non-zero if
+# any of them falls back to a full table scan.
+# run from src/: python -m benchmarks.query_plans [database_url]
+import sys
+from datetime import date
+
+from sqlalchemy import create_engine, select
+
+from models import Base, Product, Basket, BasketItem, User
+from migrations import create_missing_indexes
+
+HOT_QUERIES = {
+    "product by name/price/expiration_date": select(Product).filter(
+        Product.name == "Milk", Product.price == 9.99, Product.expiration_date == date(2025, 1, 1)
+    ),
+    "product by name/expiration_date": select(Product).filter(
+        Product.name == "Milk", Product.expiration_date == date(2025, 1, 1)
+    ),
+    "user by username": select(User).filter(User.username == "Marcel"),
+    "basket by user_id": select(Basket).filter(Basket.user_id == 1),
+    "basket item by basket_id/product_id": select(BasketItem).filter(
+        BasketItem.basket_id == 1, BasketItem.product_id == 1
+    ),
+    "basket items by basket_id": select(BasketItem).filter(BasketItem.basket_id == 1),
+}
+
+
+def query_plan(connection, dialect, statement):
+    compiled = statement.compile(dialect=dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    cursor = connection.cursor()
+    cursor.execute("EXPLAIN QUERY PLAN " + str(compiled), params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def check(url: str = "sqlite://") -> list:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes(engine)
+    failures = []
+    connection = engine.raw_connection()
+    try:
+        for name, statement in HOT_QUERIES.items():
+            plan = query_plan(connection, engine.dialect, statement)
+            uses_index = not any(step.startswith("SCAN") for step in plan)
+            print(f"{'ok  ' if uses_index else 'SCAN'} {name}: {' | '.join(plan)}")
+            if not uses_index:
+                failures.append(name)
+    finally:
+        connection.close()
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check(sys.argv[1] if len(sys.argv) > 1 else "sqlite://")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,66 @@
+# cost of scoring one checkout as the purchase history grows: the
+# incremental RecipeScorer only applies the new purchases, the from-scratch
+# recompute rescans the whole history. Exits non-zero if the two disagree.
+# run from src/: python -m benchmarks.recommendations --recipes 1000 --history 100000
+import argparse
+import random
+import sys
+import time
+
+from recalg import RecipeCatalog, RecipeScorer, recompute_scores
+
+
+def make_recipes(count: int, ingredients: list, rng: random.Random) -> list:
+    return [
+        {"name": f"Recipe {i}", "ingredients": rng.sample(ingredients, 6), "instructions": "", "popularity": rng.randrange(100)}
+        for i in range(count)
+    ]
+
+
+def make_purchase(ingredients: list, rng: random.Random) -> dict:
+    day = rng.randrange(1, 29)
+    return {"name": rng.choice(ingredients), "quantity": rng.randrange(1, 4), "price": 1.0,
+            "expiration_date": f"{day:02d}/12/2024"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--ingredients", type=int, default=300)
+    parser.add_argument("--history", type=int, default=100000)
+    parser.add_argument("--checkout", type=int, default=10, help="purchases per checkout")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    ingredients = [f"Ingredient {i}" for i in range(args.ingredients)]
+    recipes = make_recipes(args.recipes, ingredients, rng)
+    start = time.perf_counter()
+    catalog = RecipeCatalog(recipes, "bench")
+    print(f"ingredient index over {len(recipes)} recipes built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    scorer = RecipeScorer(catalog)
+    history = []
+
+    print(f"{'history':>10} {'incremental ms':>15} {'recompute ms':>13}")
+    size = 1000
+    while size <= args.history:
+        while len(history) < size - args.checkout:
+            history.append(make_purchase(ingredients, rng))
+        scorer.apply(history)
+        history.extend(make_purchase(ingredients, rng) for _ in range(args.checkout))
+
+        start = time.perf_counter()
+        scorer.apply(history)
+        incremental = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = recompute_scores(history, recipes)
+        recompute = time.perf_counter() - start
+
+        print(f"{len(history):>10} {incremental * 1000:>15.3f} {recompute * 1000:>13.1f}")
+        if scorer.scores != expected:
+            print("MISMATCH: incremental scores differ from a full recompute")
+            sys.exit(1)
+        size *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# latency summaries shared by the load benchmarks, in milliseconds
+import subprocess
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    values = sorted(latencies)
+    count = len(values)
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(percentile(values, p) * 1000, 3)
+    summary["max_ms"] = round(values[-1] * 1000, 3) if count else 0.0
+    return summary
+
+
+# the commit the numbers belong to, so runs can be compared
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
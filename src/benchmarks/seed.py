@@ -0,0 +1,95 @@
+# fills a SQLite database with users, products, baskets and basket items for
+# the load benchmarks. Everything is derived from the row number, so a
+# benchmark can rebuild a product's name/price/date or a username without
+# reading them back. Every user has the password "password".
+# run from src/: python -m benchmarks.seed bench.db --users 10000 --products 1000000 --baskets 10000 --items 20
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import create_engine, insert
+
+from auth import get_password_hash
+from models import Base, User, Product, Basket, BasketItem
+from migrations import create_missing_indexes
+from search import create_search_index
+
+CATEGORIES = ("Dairy", "Bakery", "Produce", "Meat", "Frozen", "Drinks", "Snacks", "Household")
+PASSWORD = "password"
+CHUNK_SIZE = 10_000
+
+
+def username(i: int) -> str:
+    return f"user{i}"
+
+
+# product i has id i + 1 in a freshly seeded database
+def product_fields(i: int) -> dict:
+    return {
+        "name": f"Product {i}",
+        "price": round(0.49 + (i * 7919 % 2000) / 100, 2),
+        "stock": 1_000_000,
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "image": f"product_images/{i % 100}.jpg",
+        "expiration_date": date(2026, 1, 1) + timedelta(days=i % 365),
+    }
+
+
+def _insert_chunked(connection, table, count: int, make_row):
+    for start in range(0, count, CHUNK_SIZE):
+        connection.execute(insert(table), [make_row(i) for i in range(start, min(start + CHUNK_SIZE, count))])
+
+
+def seed(url: str, users: int, products: int, baskets: int, items: int, seed_value: int = 0, stock: Optional[int] = None) -> dict:
+    baskets = min(baskets, users)
+    items = min(items, products)
+    rng = random.Random(seed_value)
+    hashed = get_password_hash(PASSWORD)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        # not in the metadata, so drop_all would leave a stale index behind
+        connection.exec_driver_sql("DROP TABLE IF EXISTS products_fts")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        _insert_chunked(connection, User.__table__, users, lambda i: {"username": username(i), "password": hashed, "is_admin": 0})
+        make_product = product_fields if stock is None else lambda i: {**product_fields(i), "stock": stock}
+        _insert_chunked(connection, Product.__table__, products, make_product)
+        basket_rows, item_rows = [], []
+        for basket in range(baskets):
+            total = 0.0
+            for product in rng.sample(range(products), items):
+                price = product_fields(product)["price"]
+                total += price
+                item_rows.append({"basket_id": basket + 1, "product_id": product + 1, "quantity": 1, "total_price": price})
+            basket_rows.append({"user_id": basket + 1, "quantity": items, "total_price": round(total, 2)})
+            if len(item_rows) >= CHUNK_SIZE or basket == baskets - 1:
+                connection.execute(insert(Basket.__table__), basket_rows)
+                if item_rows:
+                    connection.execute(insert(BasketItem.__table__), item_rows)
+                basket_rows, item_rows = [], []
+    create_missing_indexes(engine)
+    # built once over the loaded rows rather than row by row through the triggers
+    create_search_index(engine)
+    engine.dispose()
+    return {"users": users, "products": products, "baskets": baskets, "items_per_basket": items,
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--baskets", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=10)
+    args = parser.parse_args()
+    print(seed(f"sqlite:///{args.path}", args.users, args.products, args.baskets, args.items))
+
+
+if __name__ == "__main__":
+    main()
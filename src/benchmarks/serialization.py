@@ -0,0 +1,65 @@
+# cost of building a 10k-product response: ORM objects through
+# jsonable_encoder + json (the old path) against column rows through orjson
+# run from src/: python -m benchmarks.serialization --products 10000
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Product
+from schemas import ProductOut
+from serialization import PRODUCT_COLUMNS, dumps, rows_to_dicts
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([
+            Product(name=f"Product {i}", price=i % 100 + 0.99, stock=100, category="Food", image=f"product_images/{i}.jpg",
+                    expiration_date=date(2025, 1, 1) + timedelta(days=i % 365))
+            for i in range(args.products)
+        ])
+        db.commit()
+
+    products_out = TypeAdapter(list[ProductOut])
+
+    def generic():
+        with Session() as db:
+            json.dumps(jsonable_encoder(db.query(Product).all())).encode()
+
+    def response_model():
+        with Session() as db:
+            products_out.dump_json(products_out.validate_python(db.query(Product).all(), from_attributes=True))
+
+    def rows():
+        with Session() as db:
+            dumps(rows_to_dicts(db.execute(select(*PRODUCT_COLUMNS)).all()))
+
+    print(f"ORM + jsonable_encoder + json: {best_of(generic, args.repeat):8.1f} ms")
+    print(f"ORM + pydantic v2 model:       {best_of(response_model, args.repeat):8.1f} ms")
+    print(f"row tuples + orjson:           {best_of(rows, args.repeat):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
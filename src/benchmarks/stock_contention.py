@@ -0,0 +1,92 @@
+# many threads reserving stock of one product at once; checks that nothing is
+# oversold and reports reservations/sec. --naive runs the old
+# read / compare / write-back code for comparison.
+# run from src/: python -m benchmarks.stock_contention --threads 32 --stock 2000
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Product
+from stock import reserve_stock
+
+
+def reserve_naive(db, product_id: int, quantity: int) -> bool:
+    product = db.get(Product, product_id)
+    if product.stock < quantity:
+        return False
+    product.stock -= quantity
+    return True
+
+
+def worker(Session, reserve, product_id, quantity, counts, lock):
+    reserved = errors = 0
+    while True:
+        db = Session()
+        try:
+            ok = reserve(db, product_id, quantity)
+            db.commit()
+        except OperationalError:
+            db.rollback()
+            errors += 1
+            continue
+        finally:
+            db.close()
+        if not ok:
+            break
+        reserved += 1
+    with lock:
+        counts["reserved"] += reserved
+        counts["errors"] += errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--naive", action="store_true")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "stock.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30, "check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        product = Product(name="Milk", price=9.99, stock=args.stock)
+        db.add(product)
+        db.commit()
+        product_id = product.id
+
+    counts = {"reserved": 0, "errors": 0}
+    lock = threading.Lock()
+    reserve = reserve_naive if args.naive else reserve_stock
+    threads = [
+        threading.Thread(target=worker, args=(Session, reserve, product_id, args.quantity, counts, lock))
+        for _ in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with Session() as db:
+        final_stock = db.get(Product, product_id).stock
+    sold = counts["reserved"] * args.quantity
+    print(f"reserved {counts['reserved']} in {elapsed:.2f}s ({counts['reserved'] / elapsed:.0f}/s), "
+          f"lock errors {counts['errors']}, final stock {final_stock}")
+    if sold > args.stock or final_stock != args.stock - sold:
+        print(f"OVERSOLD: sold {sold} of {args.stock}, stock column says {args.stock - final_stock}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
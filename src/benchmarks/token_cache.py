@@ -0,0 +1,25 @@
+# cached vs uncached auth.verify_token
+# run from src/: python -m benchmarks.token_cache --calls 20000
+import argparse
+import timeit
+
+from auth import create_access_token, verify_token, token_cache, token_cache_stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "bench"})
+    token_cache.clear()
+
+    uncached = timeit.timeit(lambda: verify_token(token, use_cache=False), number=args.calls)
+    cached = timeit.timeit(lambda: verify_token(token), number=args.calls)
+    print(f"uncached: {uncached / args.calls * 1e6:8.2f} us/call")
+    print(f"cached:   {cached / args.calls * 1e6:8.2f} us/call ({uncached / cached:.1f}x)")
+    print(token_cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import itertools
+import os
+import secrets
+import threading
+from typing import Optional
+from fastapi import Request, Response
+from cache import TTLCache
+from serialization import dumps
+
+# In-process read-through cache for the product catalog routes.
+#
+# Every write that changes a product (stock included) bumps a version counter
+# after its commit. Cached bodies are keyed by (version, url), so a bump
+# makes all of them unreachable at once, and the version doubles as the
+# ETag: a client sending a matching If-None-Match for a cached url gets a 304
+# without a database hit or any serialization. Only urls the route answered
+# with a 200 are cached, so a 304 never stands in for a 404.
+#
+# The version lives in this process only. The ETag carries a random epoch
+# picked at startup, so tags from before a restart never match. But the
+# cache assumes a single worker: a write handled by one uvicorn worker does
+# not invalidate the others' caches, so run with --workers 1 (or turn the
+# cache off with CATALOG_CACHE_SIZE=0) when scaling out. Turned off, every
+# request goes to the database and no ETag is sent.
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "600"))
+
+class CatalogCache:
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL):
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self.version = 0
+        self.epoch = secrets.token_hex(4)
+        self.enabled = maxsize > 0 and ttl > 0
+        self.responses = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+
+    def bump(self):
+        with self._lock:
+            self.version = next(self._versions)
+
+    def etag(self, version: int) -> str:
+        return f'"catalog-{self.epoch}-{version}"'
+
+    def _not_modified(self, request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        return etag in tags or "*" in tags
+
+    # 304 or the cached body for this url at the given version, None on a miss
+    def lookup(self, request: Request, version: int) -> Optional[Response]:
+        if not self.enabled:
+            return None
+        entry = self.responses.get((version, str(request.url)))
+        if entry is None:
+            return None
+        etag = self.etag(version)
+        if self._not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        body, headers = entry
+        return Response(body, media_type="application/json", headers={**headers, "ETag": etag})
+
+    # content: plain dicts / lists, serialized once with orjson
+    def store(self, request: Request, version: int, content, headers: Optional[dict] = None) -> Response:
+        headers = headers or {}
+        body = dumps(content)
+        if not self.enabled:
+            return Response(body, media_type="application/json", headers=headers)
+        self.responses.set((version, str(request.url)), (body, headers))
+        return Response(body, media_type="application/json", headers={**headers, "ETag": self.etag(version)})
+
+catalog_cache = CatalogCache()
+
+def bump_catalog_version():
+    catalog_cache.bump()
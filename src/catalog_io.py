@@ -0,0 +1,154 @@
+import csv
+import orjson
+from typing import AsyncIterator, Iterator
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from models import Product
+from schemas import ProductImportRow
+from serialization import PRODUCT_COLUMNS
+from catalog_cache import bump_catalog_version
+from database import SessionLocal, ReadSessionLocal
+
+# Bulk catalog load and dump.
+#
+# /products/import reads the request body as it arrives, validates each row
+# and upserts on (name, expiration_date), the same key POST /products treats
+# as a duplicate. Rows go to the database a chunk at a time: one SELECT finds
+# which keys already exist, then one executemany UPDATE and one executemany
+# INSERT, committed on its own. The write connection is only taken while a
+# chunk is written, never while waiting on the upload, so a slow client
+# doesn't hold up other writes; only one chunk is held in memory.
+#
+# /products/export streams NDJSON from a yield_per cursor, again one chunk at
+# a time.
+
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_CHUNK_SIZE = 2000
+# per-row errors beyond this are only counted
+MAX_REPORTED_ERRORS = 1000
+
+def _decode(line: bytes, number: int):
+    try:
+        return line.decode("utf-8", errors="strict").rstrip("\r")
+    except UnicodeDecodeError as error:
+        return ValueError(f"line {number} is not valid UTF-8: {error.reason} at byte {error.start}")
+
+# yields each line as text, or a ValueError for a line that doesn't decode
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator:
+    buffer, number = b"", 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield _decode(line, number)
+    if buffer:
+        yield _decode(buffer, number + 1)
+
+# CSV records may have quoted newlines; a record is complete once its quotes balance
+async def _csv_records(lines: AsyncIterator) -> AsyncIterator[dict]:
+    header, pending = None, None
+    async for line in lines:
+        if isinstance(line, ValueError):
+            # the record the bad line belongs to is dropped with it
+            pending = None
+            yield line
+            continue
+        pending = line if pending is None else pending + "\n" + line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, None
+        if not record.strip():
+            continue
+        fields = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            continue
+        yield dict(zip(header, fields))
+    if pending is not None:
+        yield ValueError("unterminated quoted field")
+
+async def _ndjson_records(lines: AsyncIterator) -> AsyncIterator[dict]:
+    async for line in lines:
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            yield ValueError(f"invalid JSON: {error}")
+
+def _upsert_chunk(db: Session, rows: list[ProductImportRow]) -> tuple[int, int]:
+    # the last row wins when a chunk repeats a key
+    by_key = {(row.name, row.expiration_date): row for row in rows}
+    found = db.execute(
+        select(Product.id, Product.name, Product.expiration_date)
+        .where(tuple_(Product.name, Product.expiration_date).in_(list(by_key)))
+    )
+    existing = {(name, expiration_date): id for id, name, expiration_date in found}
+    updates, inserts = [], []
+    for key, row in by_key.items():
+        values = row.model_dump(exclude_unset=True)
+        if key in existing:
+            updates.append({"id": existing[key], **values})
+        else:
+            inserts.append(row.model_dump())
+    if updates:
+        db.execute(update(Product), updates)
+    if inserts:
+        db.execute(insert(Product), inserts)
+    return len(inserts), len(rows) - len(inserts)
+
+def _write_chunk(rows: list[ProductImportRow]) -> tuple[int, int]:
+    with SessionLocal() as db:
+        counts = _upsert_chunk(db, rows)
+        db.commit()
+    bump_catalog_version()
+    return counts
+
+async def import_products(stream: AsyncIterator[bytes], content_type: str) -> dict:
+    lines = _lines(stream)
+    records = _csv_records(lines) if "csv" in content_type else _ndjson_records(lines)
+    report = {"rows": 0, "inserted": 0, "updated": 0, "error_count": 0, "errors": []}
+    chunk = []
+
+    async def flush():
+        nonlocal chunk
+        inserted, updated = await run_in_threadpool(_write_chunk, chunk)
+        report["inserted"] += inserted
+        report["updated"] += updated
+        chunk = []
+
+    async for record in records:
+        report["rows"] += 1
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("expected an object")
+            # empty CSV cells count as missing
+            chunk.append(ProductImportRow.model_validate({k: v for k, v in record.items() if v != ""}))
+        except (ValueError, ValidationError) as error:
+            report["error_count"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                detail = error.errors(include_url=False, include_input=False) if isinstance(error, ValidationError) else str(error)
+                report["errors"].append({"row": report["rows"], "error": detail})
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+    return report
+
+# runs in the threadpool as the StreamingResponse body; it opens its own
+# session because the request's one is closed before the body is sent
+def export_products() -> Iterator[bytes]:
+    with ReadSessionLocal() as db:
+        result = db.execute(select(*PRODUCT_COLUMNS).order_by(Product.id).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        keys = result.keys()
+        for partition in result.partitions():
+            yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in partition)
@@ -1,16 +1,98 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from metrics import instrument_engine
 
-DATABASE_URL = "sqlite:///./test.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
 
-engine = create_engine(DATABASE_URL)
+# SQLite allows one writer at a time, so writes go through a single pooled
+# connection and queue in the pool instead of fighting over the file lock.
+# Reads get their own pool of query_only connections; under WAL they read
+# the last committed state without waiting for the writer.
+WRITE_POOL_TIMEOUT = float(os.getenv("DB_WRITE_POOL_TIMEOUT", "30"))
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+READ_POOL_OVERFLOW = int(os.getenv("DB_READ_POOL_OVERFLOW", "8"))
+
+# applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # negative is KiB rather than pages
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(engine, read_only: bool = False):
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            # switching the journal mode needs a write
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+def _engine_options(read_only: bool) -> dict:
+    if read_only:
+        return {"pool_size": READ_POOL_SIZE, "max_overflow": READ_POOL_OVERFLOW}
+    return {"pool_size": 1, "max_overflow": 0, "pool_timeout": WRITE_POOL_TIMEOUT}
+
+engine = create_engine(DATABASE_URL, **_engine_options(read_only=False))
+read_engine = create_engine(DATABASE_URL, **_engine_options(read_only=True))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
+# async engines used by the /async routes, same database file as the sync ones;
+# aiosqlite defaults to NullPool, which takes no pool sizes
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **_engine_options(read_only=False))
+async_read_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **_engine_options(read_only=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# the pooled aiosqlite connections each keep a non-daemon thread running, so
+# anything that used the async engines has to dispose of them before exiting
+async def dispose_async_engines():
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+for _engine, _read_only in ((engine, False), (read_engine, True), (async_engine.sync_engine, False), (async_read_engine.sync_engine, True)):
+    apply_sqlite_pragmas(_engine, read_only=_read_only)
+    # count statements and SQL time per request for /metrics and the X-DB-Query-* headers
+    instrument_engine(_engine)
+
+# sessions for routes that write
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# sessions for GET routes
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,80 @@
+from typing import NamedTuple, Optional
+from fastapi import Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, Basket
+from database import get_read_db, get_async_read_db
+from auth import verify_token, oauth2_scheme
+from cache import TTLCache
+
+CURRENT_USER_CACHE_SIZE = 4096
+CURRENT_USER_CACHE_TTL = 300
+
+class CurrentUser(NamedTuple):
+    username: str
+    user_id: int
+    basket_id: Optional[int]
+
+# token subject (username) -> CurrentUser
+current_user_cache = TTLCache(maxsize=CURRENT_USER_CACHE_SIZE, ttl=CURRENT_USER_CACHE_TTL)
+
+def invalidate_current_user(username: Optional[str] = None):
+    if username is None:
+        current_user_cache.clear()
+    else:
+        current_user_cache.pop(username)
+
+def _token_subject(token: str) -> str:
+    payload = verify_token(token)
+    username = payload.get("sub")
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return username
+
+# user and basket ids in one query: users LEFT JOIN basket
+def _current_user_query(username: str):
+    return (
+        select(User.id, Basket.id)
+        .outerjoin(Basket, Basket.user_id == User.id)
+        .filter(User.username == username)
+        .limit(1)
+    )
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)) -> CurrentUser:
+    username = _token_subject(token)
+    current = current_user_cache.get(username)
+    if current is None:
+        row = db.execute(_current_user_query(username)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        current = CurrentUser(username, *row)
+        current_user_cache.set(username, current)
+    return current
+
+def get_current_basket(current: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if current.basket_id is None:
+        raise HTTPException(status_code=404, detail="Basket not found")
+    return current
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_read_db)) -> CurrentUser:
+    username = _token_subject(token)
+    current = current_user_cache.get(username)
+    if current is None:
+        row = (await db.execute(_current_user_query(username))).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        current = CurrentUser(username, *row)
+        current_user_cache.set(username, current)
+    return current
+
+async def get_current_basket_async(current: CurrentUser = Depends(get_current_user_async)) -> CurrentUser:
+    if current.basket_id is None:
+        raise HTTPException(status_code=404, detail="Basket not found")
+    return current
+
+def get_current_admin(current: CurrentUser = Depends(get_current_user), db: Session = Depends(get_read_db)) -> CurrentUser:
+    user = db.get(User, current.user_id)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    return current
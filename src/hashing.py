@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+
+# bcrypt is deliberately slow and holds the GIL, so /register and /login send
+# it to a pool of worker processes instead of running it on the request
+# thread. Jobs beyond workers + queue_limit are refused with a 503 rather
+# than piling up behind a login burst.
+
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", HASH_WORKERS * 16))
+
+class HashPool:
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a server that already runs threads is not safe
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    async def run(self, fn, *args):
+        # workers=0 runs the job inline, which is only useful for comparisons
+        if self.workers == 0:
+            return fn(*args)
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+            self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+hash_pool = HashPool()
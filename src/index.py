@@ -12,7 +12,12 @@ from recalg import *
 import streamlit as st
 import plotly.express as px
 st.set_page_config(layout="wide")
-backend =  BackendMiddleware("http://0.0.0.0:8000")
+# one client (and its keep-alive connections) for the whole Streamlit process, not one per rerun
+@st.cache_resource
+def get_backend() -> BackendMiddleware:
+    return BackendMiddleware("http://0.0.0.0:8000")
+
+backend = get_backend()
 token = None
 
 def load_data():
@@ -230,11 +235,20 @@ def display_home():
         # Displaying Recommended Recipes
         st.subheader("🍴 Recommended Recipes")
         st.write("Here are some of our favorite recipes to try with our products:")
-        with open("recommendations_Marcel.json", "r") as f:
-            buf = json.load(f)
+        recipes = []
+        if st.session_state.get("access_token"):
+            try:
+                recipes = backend.get_recommendations(st.session_state.access_token, k=3)
+            except ValueError as e:
+                print(e)
+
+        # logged out, or nothing checked out on the backend yet: the local history's picks
+        if not recipes and os.path.exists("recommendations_Marcel.json"):
+            with open("recommendations_Marcel.json", "r") as f:
+                recipes = json.load(f).get("recipes", [])
 
-        if "recipes" in buf and buf["recipes"]:
-            for recipe in buf["recipes"]:
+        if recipes:
+            for recipe in recipes:
                 with st.container():
                     st.write(f"- **{recipe['name']}**: {recipe['instructions']}")
         else:
@@ -368,6 +382,28 @@ def display_cart():
         st.rerun()
 
 
+# send the cart to the user's backend basket in one batch and check it out
+def checkout_on_backend(token, cart):
+    items = [
+        {
+            "name": product_name,
+            "price": cart_item["price"],
+            "expiration_date": datetime.strptime(cart_item["produce_date"], "%d/%m/%Y").date().isoformat(),
+            "quantity": cart_item["quantity"],
+        }
+        for product_name, cart_item in cart.items()
+    ]
+    if not items:
+        return None
+    user = backend.get_user_details(token)
+    try:
+        backend.create_basket(token, user["id"])
+    except ValueError:
+        pass  # the basket from an earlier checkout is reused
+    backend.add_many_to_basket(token, items)
+    return backend.checkout_basket(token)
+
+
 def display_scanner():
     st.title("📷 Scan a Product!")
     decoded = scan_code()  # Get the scanned product name and expiration date from the scanned code
@@ -405,11 +441,11 @@ def display_scanner():
 
     elif decoded == "Checkout":
         # Decrement quantities in the JSON data
+        purchases = []
         for product_name, cart_item in st.session_state.cart.items():
             product_info = next((p for p in data["products"] if p["name"] == product_name), None)
             sender = Product(product_name, cart_item["quantity"], cart_item["price"], cart_item["produce_date"])
-            addpurchasetojson(sender.jsonify(), "Marcel.json")
-            recalg("Marcel.json", "recipes.json", "recommendations_Marcel.json")
+            purchases.append(sender.jsonify())
             if product_info:
                 product_info["number_of_products"] -= cart_item["quantity"]
 
@@ -417,6 +453,18 @@ def display_scanner():
                 if product_info["number_of_products"] < 0:
                     product_info["number_of_products"] = 0
 
+        # Record the whole checkout at once and recompute the local recommendations a single time
+        if purchases:
+            addpurchasestojson(purchases, "Marcel.json")
+            recalg("Marcel.json", "recipes.json", "recommendations_Marcel.json")
+
+        # Finalize the order on the backend too when logged in against the API
+        if st.session_state.get("access_token"):
+            try:
+                checkout_on_backend(st.session_state.access_token, st.session_state.cart)
+            except ValueError as e:
+                print(e)
+
         # Clear the cart after checkout
         st.session_state.cart = {}
 
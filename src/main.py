@@ -1,89 +1,109 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import *
-from database import engine, get_db
-from auth import verify_password, get_password_hash, create_access_token, verify_token
+from schemas import *
+from database import engine, get_db, get_read_db, get_async_read_db, AsyncSessionLocal, dispose_async_engines
+from auth import get_password_hash_async, verify_and_update_password_async, create_access_token, verify_token, oauth2_scheme
+from hashing import hash_pool
+from stock import reserve_stock, release_stock
+from baskets import add_product_to_basket, add_products_to_basket, checkout_basket, parse_expand, basket_view_statement, basket_view
+from dependencies import CurrentUser, get_current_admin, get_current_user, get_current_basket, invalidate_current_user
+from async_routes import router as async_router
+from catalog_cache import catalog_cache, bump_catalog_version
+from serialization import rows_response, rows_to_dicts, USER_COLUMNS, PRODUCT_COLUMNS, BASKET_COLUMNS, BASKET_ITEM_COLUMNS
+from metrics import metrics, MetricsMiddleware
+from profiling import profiler, ProfilingMiddleware
+from migrations import create_missing_indexes
+from search import create_search_index, search_products
+from catalog_io import import_products, export_products
+from recommendations import recommend_recipes
+from pagination import paginate, set_next_cursor, sort_column, PRODUCT_SORTS, USER_SORTS, BASKET_SORTS
 from datetime import date
 
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-
-# OAuth2PasswordBearer is used to get the token from the Authorization header
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-class UserOut(BaseModel):
-    id: int
-    username: str
-    is_admin: int
-
-    class Config:
-        orm_mode = True
-
-class UserCreate(BaseModel):
-    username: str
-    password: str
-    is_admin: int
-    
-class LoginRequest(BaseModel):
-    username: str
-    password: str
-    
-class ProductCreate(BaseModel):
-    name: str
-    price: float
-    stock: int
-    category: str
-    expiration_date: date
-    
-class ProductUpdate(BaseModel):
-    name: str
-    price: float
-    stock: int
-    category: str
-    expiration_date: date
-    
-class BasketCreate(BaseModel):
-    user_id: int
-    
-class BasketUpdate(BaseModel):
-    user_id: int
-
-class BasketItemCreate(BaseModel):
-    product_id: int
-    quantity: int
-
-class BasketItemUpdate(BaseModel):
-    product_id: int
-    quantity: int
-    
-class StockUpdate(BaseModel):
-    stock: int
-    
-class BasketItemRequest(BaseModel):
-    quantity: int
-
+create_missing_indexes(engine)
+create_search_index(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    hash_pool.shutdown()
+    profiler.stop()
+    await dispose_async_engines()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.include_router(async_router, prefix="/async")
+
+# Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# start sampling the requests whose path matches, replacing any earlier run
+@app.post("/admin/profiling")
+def start_profiling(config: ProfilingConfig, admin: CurrentUser = Depends(get_current_admin)):
+    profiler.start(config.route, config.sample_rate, config.interval_ms / 1000)
+    return profiler.status()
+
+# collapsed stacks, one "frame;frame;frame count" line per stack
+@app.get("/admin/profiling", response_class=PlainTextResponse)
+def read_profiling(admin: CurrentUser = Depends(get_current_admin)):
+    return PlainTextResponse(profiler.collapsed())
+
+@app.get("/admin/profiling/status")
+def read_profiling_status(admin: CurrentUser = Depends(get_current_admin)):
+    return profiler.status()
+
+@app.delete("/admin/profiling")
+def stop_profiling(admin: CurrentUser = Depends(get_current_admin)):
+    profiler.stop()
+    return profiler.status()
+
+# password hashing runs in the hashing process pool, so these two are async.
+# The lookup runs on the read engine and its connection is released before
+# the hash is awaited; the single write connection is only taken for the
+# insert or the rehash, so logins don't queue behind each other's bcrypt.
 @app.post("/register", response_model=UserOut)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_read_db)):
+    existing = (await db.execute(select(User.id).filter(User.username == user.username))).first()
+    await db.close()
+    if existing:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = get_password_hash(user.password)
-    new_user = User(username=user.username, password=hashed_password, is_admin=user.is_admin)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    hashed_password = await get_password_hash_async(user.password)
+    async with AsyncSessionLocal() as writer:
+        new_user = User(username=user.username, password=hashed_password, is_admin=user.is_admin)
+        writer.add(new_user)
+        try:
+            await writer.commit()
+        except IntegrityError:
+            # registered by a concurrent request while this one was hashing
+            raise HTTPException(status_code=400, detail="Username already registered")
+        return new_user
 
 @app.post("/login")
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == login_data.username).first()
-    if not user or not verify_password(login_data.password, user.password):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_read_db)):
+    user = (await db.execute(select(User.id, User.username, User.password, User.is_admin).filter(User.username == login_data.username))).first()
+    await db.close()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_and_update_password_async(login_data.password, user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # BCRYPT_ROUNDS changed since this hash was made
+    if new_hash:
+        async with AsyncSessionLocal() as writer:
+            await writer.execute(update(User).where(User.id == user.id).values(password=new_hash))
+            await writer.commit()
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer", "is_admin": user.is_admin}
 
@@ -93,7 +113,7 @@ def logout(token: str = Depends(oauth2_scheme)):
     return {"msg": "Successfully logged out"}
 
 @app.get("/users/me", response_model=UserOut)
-def read_users_me(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def read_users_me(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
     try:
         payload = verify_token(token)
         username = payload.get("sub")
@@ -108,20 +128,28 @@ def read_users_me(token: str = Depends(oauth2_scheme), db: Session = Depends(get
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+# best k recipes for what the user has checked out, cached until their next checkout
+@app.get("/users/me/recommendations", response_model=list[RecipeRecommendation])
+def read_recommendations(k: int = Query(3, ge=1, le=50), current: CurrentUser = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return recommend_recipes(db, current.user_id, k)
+
 @app.get("/users/{user_id}", response_model=UserOut)
-def read_user(user_id: int, db: Session = Depends(get_db)):
+def read_user(user_id: int, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.get("/users", response_model=list[UserOut])
-def read_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
-
-@app.get("/users/{user_id}/basket")
-def read_user_basket(user_id: int, db: Session = Depends(get_db)):
+def read_users(skip: int = 0, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", db: Session = Depends(get_read_db)):
+    column = sort_column(USER_SORTS, sort)
+    users = db.execute(paginate(select(*USER_COLUMNS), User.id, column, sort, skip, limit, cursor)).all()
+    headers = {}
+    set_next_cursor(headers, users, sort, limit)
+    return rows_response(users, headers)
+
+@app.get("/users/{user_id}/basket", response_model=BasketOut)
+def read_user_basket(user_id: int, db: Session = Depends(get_read_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -132,27 +160,57 @@ def read_user_basket(user_id: int, db: Session = Depends(get_db)):
     return basket
 
 
-@app.get("/products")
-def read_products(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    products = db.query(Product).offset(skip).limit(limit).all()
-    return products
+@app.get("/products", response_model=list[ProductOut])
+def read_products(request: Request, skip: int = 0, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", db: Session = Depends(get_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    column = sort_column(PRODUCT_SORTS, sort)
+    products = db.execute(paginate(select(*PRODUCT_COLUMNS), Product.id, column, sort, skip, limit, cursor)).all()
+    headers = {}
+    set_next_cursor(headers, products, sort, limit)
+    return catalog_cache.store(request, version, rows_to_dicts(products), headers)
+
+# full-text search over name and category, best match first; declared before
+# /products/{product_id} so "search" isn't taken for an id
+@app.get("/products/search", response_model=list[ProductSearchResult])
+def search_catalog(request: Request, q: str, limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    return catalog_cache.store(request, version, search_products(db, q, limit))
+
+# declared before /products/{product_id}, like /products/search
+@app.get("/products/export")
+def export_catalog():
+    return StreamingResponse(export_products(), media_type="application/x-ndjson")
 
 # get product by full name, price and expiration date
-@app.get("/products/{name}/{price}/{expiration_date}")
-def read_product_by_name_price_expiration_date(name: str, price: float, expiration_date: date, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.name == name, Product.price == price, Product.expiration_date == expiration_date).first()
+@app.get("/products/{name}/{price}/{expiration_date}", response_model=ProductOut)
+def read_product_by_name_price_expiration_date(request: Request, name: str, price: float, expiration_date: date, db: Session = Depends(get_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    product = db.execute(select(*PRODUCT_COLUMNS).filter(Product.name == name, Product.price == price, Product.expiration_date == expiration_date)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
-
-@app.get("/products/{product_id}")
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    return catalog_cache.store(request, version, product._asdict())
+
+@app.get("/products/{product_id}", response_model=ProductOut)
+def read_product(request: Request, product_id: int, db: Session = Depends(get_read_db)):
+    version = catalog_cache.version
+    cached = catalog_cache.lookup(request, version)
+    if cached:
+        return cached
+    product = db.execute(select(*PRODUCT_COLUMNS).filter(Product.id == product_id)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return catalog_cache.store(request, version, product._asdict())
 
-@app.post("/products")
+@app.post("/products", response_model=ProductOut)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     db_product = db.query(Product).filter(Product.name == product.name, Product.expiration_date == product.expiration_date).first()
     if db_product:
@@ -160,10 +218,11 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     new_product = Product(**product.dict())
     db.add(new_product)
     db.commit()
+    bump_catalog_version()
     db.refresh(new_product)
     return new_product
 
-@app.put("/products/{product_id}")
+@app.put("/products/{product_id}", response_model=ProductOut)
 def update_product(product_id: int, product: ProductUpdate, db: Session = Depends(get_db)):
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if not db_product:
@@ -171,32 +230,35 @@ def update_product(product_id: int, product: ProductUpdate, db: Session = Depend
     for key, value in product.dict().items():
         setattr(db_product, key, value)
     db.commit()
+    bump_catalog_version()
     db.refresh(db_product)
     return db_product
 
 # increase stock of a product
-@app.put("/products/{product_id}/stock/increase")
+@app.put("/products/{product_id}/stock/increase", response_model=ProductOut)
 def increase_stock(product_id: int, stock: StockUpdate, db: Session = Depends(get_db)):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
-    if not db_product:
+    if not release_stock(db, product_id, stock.stock):
         raise HTTPException(status_code=404, detail="Product not found")
-    db_product.stock += stock.stock
     db.commit()
-    db.refresh(db_product)
-    return db_product
+    bump_catalog_version()
+    return db.get(Product, product_id)
 
 # decrease stock of a product
-@app.put("/products/{product_id}/stock/decrease")
+@app.put("/products/{product_id}/stock/decrease", response_model=ProductOut)
 def decrease_stock(product_id: int, stock: StockUpdate, db: Session = Depends(get_db)):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
-    if not db_product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    if db_product.stock < stock.stock:
+    if not reserve_stock(db, product_id, stock.stock):
+        db.rollback()
+        if not db.get(Product, product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
         raise HTTPException(status_code=400, detail="Not enough stock available")
-    db_product.stock -= stock.stock
     db.commit()
-    db.refresh(db_product)
-    return db_product
+    bump_catalog_version()
+    return db.get(Product, product_id)
+
+# bulk upsert from a CSV (Content-Type: text/csv, header row first) or NDJSON body
+@app.post("/products/import")
+async def import_catalog(request: Request):
+    return await import_products(request.stream(), request.headers.get("content-type", ""))
 
 @app.delete("/products/{product_id}")
 def delete_product(product_id: int, db: Session = Depends(get_db)):
@@ -205,117 +267,66 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
     db.delete(db_product)
     db.commit()
+    bump_catalog_version()
     return {"msg": "Product deleted"}
 
-@app.post("/basket")
+@app.post("/basket", response_model=BasketOut)
 def create_basket(basket: BasketCreate, db: Session = Depends(get_db)):
     db_basket = db.query(Basket).filter(Basket.user_id == basket.user_id).first()
     if db_basket:
         raise HTTPException(status_code=400, detail="Basket already exists")
     
-    if not db.query(User).filter(User.id == basket.user_id).first():
+    user = db.query(User).filter(User.id == basket.user_id).first()
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     new_basket = Basket(**basket.dict())
     db.add(new_basket)
     db.commit()
     db.refresh(new_basket)
+    invalidate_current_user(user.username)
     return new_basket
 
 # update basket by getting user's basket from token
-@app.put("/basket")
-def update_basket(basket: BasketUpdate, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not db_basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
-    
+@app.put("/basket", response_model=BasketOut)
+def update_basket(basket: BasketUpdate, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    db_basket = db.get(Basket, current.basket_id)
     for key, value in basket.dict().items():
         setattr(db_basket, key, value)
     db.commit()
     db.refresh(db_basket)
+    # the basket may have moved to another user
+    invalidate_current_user()
     return db_basket
 
 @app.delete("/basket")
-def delete_basket(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not db_basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
+def delete_basket(current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    db_basket = db.get(Basket, current.basket_id)
     db.delete(db_basket)
     db.commit()
+    invalidate_current_user(current.username)
     return {"msg": "Basket deleted"}
 
-@app.post("/basket/items")
-def add_basket_item(item: BasketItemCreate, token: str = Depends(oauth2_scheme) ,db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not db_basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
+# finalize the basket into an order and return the receipt
+@app.post("/basket/checkout")
+def checkout(current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    return checkout_basket(db, current.user_id, current.basket_id)
+
+@app.post("/basket/items", response_model=BasketItemOut)
+def add_basket_item(item: BasketItemCreate, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
     db_product = db.query(Product).filter(Product.id == item.product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    # check if enough stock is available
-    if db_product.stock < item.quantity:
-        raise HTTPException(status_code=400, detail="Not enough stock available")
-    
-    db_product.stock -= item.quantity
-    # if item already exists in the basket, update the quantity and total price of basket item and basket
-    db_item = db.query(BasketItem).filter(BasketItem.basket_id == db_basket.id, BasketItem.product_id == item.product_id).first()
-    if db_item:
-        db_item.basket_id = db_basket.id
-        db_item.quantity += item.quantity
-        db_item.total_price += db_product.price * item.quantity
-        db_basket.total_price += db_product.price * item.quantity
-        db_basket.quantity += item.quantity
-        db.commit()
-        db.refresh(db_item)
-        return db_item
-    
-    new_item = BasketItem(**item.dict())
-    new_item.basket_id = db_basket.id
-    db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
-    return new_item
-
-@app.put("/basket/items/{item_id}")
-def update_basket_item(item_id: int, item: BasketItemUpdate, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
+    return add_product_to_basket(db, current.basket_id, db_product, item.quantity)
+
+# add many items in one transaction, e.g. a whole checkout lane scan
+@app.post("/basket/items/batch", response_model=BasketWithItemsOut)
+def add_basket_items_batch(items: list[BasketBatchItem], current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    return add_products_to_basket(db, current.basket_id, items)
+
+@app.put("/basket/items/{item_id}", response_model=BasketItemOut)
+def update_basket_item(item_id: int, item: BasketItemUpdate, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    db_item = db.query(BasketItem).filter(BasketItem.id == item_id, BasketItem.basket_id == current.basket_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     for key, value in item.dict().items():
@@ -325,147 +336,79 @@ def update_basket_item(item_id: int, item: BasketItemUpdate, token: str = Depend
     return db_item
 
 @app.delete("/basket/items/{item_id}")
-def delete_basket_item(item_id: int, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_item = db.query(BasketItem).filter(BasketItem.id == item_id).first()
+def delete_basket_item(item_id: int, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    db_item = db.query(BasketItem).filter(BasketItem.id == item_id, BasketItem.basket_id == current.basket_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    db_product = db.query(Product).filter(Product.id == db_item.product_id).first()
-    db_product.stock += db_item.quantity
-    db_basket = db.query(Basket).filter(Basket.id == db_item.basket_id).first()
+    release_stock(db, db_item.product_id, db_item.quantity)
+    db_basket = db.get(Basket, current.basket_id)
     db_basket.total_price -= db_item.total_price
     db_basket.quantity -= db_item.quantity
     db.delete(db_item)
     db.commit()
+    bump_catalog_version()
     return {"msg": "Item deleted"}
 
 # remove n items from basket (n as link parameter)
-@app.put("/basket/items/{item_id}/remove/{quantity}")
-def remove_basket_item(item_id: int, quantity: int, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not db_basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
-    
-    db_item = db.query(BasketItem).filter(BasketItem.id == item_id).first()
+@app.put("/basket/items/{item_id}/remove/{quantity}", response_model=BasketItemOut)
+def remove_basket_item(item_id: int, quantity: int, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_db)):
+    db_item = db.query(BasketItem).filter(BasketItem.id == item_id, BasketItem.basket_id == current.basket_id).first()
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
     db_product = db.query(Product).filter(Product.id == db_item.product_id).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    db_product.stock += quantity
+    release_stock(db, db_product.id, quantity)
     db_item.quantity -= quantity
     db_item.total_price -= db_product.price * quantity
-    db_basket = db.query(Basket).filter(Basket.id == basket_id).first()
+    db_basket = db.get(Basket, current.basket_id)
     db_basket.total_price -= db_product.price * quantity
     db_basket.quantity -= quantity
     db.commit()
+    bump_catalog_version()
     db.refresh(db_item)
     return db_item
 
 # add basket item by name, price and expiration date, getting basket id from token
-@app.post("/basket/items/{name}/{price}/{expiration_date}")
+@app.post("/basket/items/{name}/{price}/{expiration_date}", response_model=BasketItemOut)
 def add_basket_item_by_name_price_expiration_date(
     name: str,
     price: float,
     expiration_date: date,
     request: BasketItemRequest,
     db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
+    current: CurrentUser = Depends(get_current_basket)
 ):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not db_basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
-    
-    quantity = request.quantity
     db_product = db.query(Product).filter(Product.name == name, Product.price == price, Product.expiration_date == expiration_date).first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    # check if enough stock is available
-    if db_product.stock < quantity:
-        raise HTTPException(status_code=400, detail="Not enough stock available")
-    
-    db_product.stock -= quantity
-    # if item already exists in the basket, update the quantity and total price of basket item and basket
-    db_item = db.query(BasketItem).filter(BasketItem.basket_id == db_basket.id, BasketItem.product_id == db_product.id).first()
-    if db_item:
-        db_item.quantity += quantity
-        db_item.total_price += db_product.price * quantity
-        db_basket.total_price += db_product.price * quantity
-        db_basket.quantity += quantity
-        db.commit()
-        db.refresh(db_item)
-        return db_item
-    
-    new_item = BasketItem(basket_id=basket_id, product_id=db_product.id, quantity=quantity)
-    db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
-    return new_item
-
-@app.get("/basket/items")
-def read_basket_items(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    basket = db.query(Basket).filter(Basket.user_id == user.id).first()
-    if not basket:
-        raise HTTPException(status_code=404, detail="Basket not found")
-    
-    items = db.query(BasketItem).filter(BasketItem.basket_id == basket.id).all()
-    return items
+    return add_product_to_basket(db, current.basket_id, db_product, request.quantity)
+
+@app.get("/basket/items", response_model=list[BasketItemOut])
+def read_basket_items(current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_read_db)):
+    items = db.execute(select(*BASKET_ITEM_COLUMNS).filter(BasketItem.basket_id == current.basket_id)).all()
+    return rows_response(items)
 
+# ?expand=items,products returns the basket with its items and their products, loaded in one query
 @app.get("/basket")
-def read_basket(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    username = payload.get("sub")
-    if not username:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    basket = db.query(Basket).filter(Basket.user_id == user.id).first()
+def read_basket(expand: Optional[str] = None, current: CurrentUser = Depends(get_current_basket), db: Session = Depends(get_read_db)):
+    if not expand:
+        basket = db.get(Basket, current.basket_id)
+        if not basket:
+            raise HTTPException(status_code=404, detail="Basket not found")
+        return basket
+    fields = parse_expand(expand)
+    basket = db.execute(basket_view_statement(current.basket_id, fields)).unique().scalars().first()
     if not basket:
         raise HTTPException(status_code=404, detail="Basket not found")
-    return basket
-
-@app.get("/baskets")
-def read_baskets(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    baskets = db.query(Basket).offset(skip).limit(limit).all()
-    return baskets
\ No newline at end of file
+    return basket_view(basket, fields)
+
+@app.get("/baskets", response_model=list[BasketOut])
+def read_baskets(skip: int = 0, limit: int = 10, cursor: Optional[str] = None, sort: str = "id", db: Session = Depends(get_read_db)):
+    column = sort_column(BASKET_SORTS, sort)
+    baskets = db.execute(paginate(select(*BASKET_COLUMNS), Basket.id, column, sort, skip, limit, cursor)).all()
+    headers = {}
+    set_next_cursor(headers, baskets, sort, limit)
+    return rows_response(baskets, headers)
\ No newline at end of file
@@ -0,0 +1,146 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+
+# Per-route latency histograms and request counts, plus SQL statement counts
+# and time per request, rendered in the Prometheus text format at /metrics.
+# Every response also carries X-DB-Query-Count / X-DB-Query-Time-ms so an
+# N+1 shows up on the request that caused it.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+# latest samples kept per route for the quantiles
+RESERVOIR_SIZE = 2048
+
+QUERY_COUNT_HEADER = b"x-db-query-count"
+QUERY_TIME_HEADER = b"x-db-query-time-ms"
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# set by the middleware for the duration of a request; the threadpool that
+# runs the sync routes copies the context, so the same object is updated
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statuses = {}
+
+    def quantile(self, q: float) -> float:
+        samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class Metrics:
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, queries: QueryStats):
+        with self._lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = RouteStats()
+            stats.count += 1
+            stats.seconds += seconds
+            index = bisect_left(LATENCY_BUCKETS, seconds)
+            if index < len(stats.buckets):
+                stats.buckets[index] += 1
+            stats.samples.append(seconds)
+            stats.queries += queries.count
+            stats.query_seconds += queries.seconds
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def render(self) -> str:
+        with self._lock:
+            routes = sorted(self.routes.items())
+            lines = [
+                "# TYPE http_requests_total counter",
+                *(f'http_requests_total{{method="{m}",route="{r}",status="{status}"}} {n}'
+                  for (m, r), stats in routes for status, n in sorted(stats.statuses.items())),
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += n
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.seconds:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+            lines.append("# TYPE http_request_latency_seconds summary")
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                for q in QUANTILES:
+                    lines.append(f'http_request_latency_seconds{{{labels},quantile="{q}"}} {stats.quantile(q):.6f}')
+            lines.append("# TYPE sql_queries_total counter")
+            lines.extend(f'sql_queries_total{{method="{m}",route="{r}"}} {stats.queries}' for (m, r), stats in routes)
+            lines.append("# TYPE sql_query_seconds_total counter")
+            lines.extend(f'sql_query_seconds_total{{method="{m}",route="{r}"}} {stats.query_seconds:.6f}' for (m, r), stats in routes)
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# plain ASGI middleware: BaseHTTPMiddleware would add a task and a body copy per request
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = QueryStats()
+        token = current_query_stats.set(queries)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_query_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER, str(queries.count).encode()))
+                headers.append((QUERY_TIME_HEADER, f"{queries.seconds * 1000:.3f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_query_headers)
+        finally:
+            current_query_stats.reset(token)
+            # the router leaves the matched route in the scope; label by its template, not the raw path
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            metrics.observe(scope["method"], path, status, time.perf_counter() - started, queries)
@@ -1,18 +1,102 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
 import requests
-from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional
 
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", "3"))
+BACKOFF = float(os.getenv("BACKEND_BACKOFF", "0.2"))
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "10"))
+
+# safe to send twice. Not PUT or DELETE: the stock increase/decrease and
+# basket remove routes are PUTs that would apply their change again
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+# longest wait between attempts, whatever the server asks for
+BACKOFF_CAP = 10.0
+
+# exponential backoff with full jitter, so retrying clients don't hit the backend in step
+def backoff_delay(attempt: int, base: float = BACKOFF, cap: float = BACKOFF_CAP) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# A 503 with Retry-After (the hashing pool's answer to /login and /register
+# when it is full) is sent before the request does any work, so it is
+# retried whatever the method.
+def should_retry(method: str, response, attempt: int, max_retries: int) -> bool:
+    if attempt >= max_retries:
+        return False
+    if response.status_code == 503 and "Retry-After" in response.headers:
+        return True
+    return method in RETRY_METHODS and response.status_code in RETRY_STATUSES
+
+# the server's Retry-After wins over the backoff, up to BACKOFF_CAP
+def retry_delay(attempt: int, response=None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_CAP)
+    return backoff_delay(attempt)
+
+# One requests.Session per instance keeps connections to the backend alive
+# between calls; build it once (index.py caches it across Streamlit reruns).
+# Every call is logged with its total time next to the time until the
+# response headers arrived and the SQL time the backend reports, which
+# separates client overhead from server time.
 class BackendMiddleware:
-    def __init__(self, base_url: str):
+    def __init__(
+            self, base_url: str, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+            max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE
+    ):
         self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _send(self, method: str, url: str, data: Optional[Any], headers: Dict[str, str]) -> requests.Response:
+        retries = self.max_retries if method in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, json=data, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                logger.info("%s %s failed after %.1f ms (attempt %d): %s",
+                            method, url, (time.perf_counter() - start) * 1000, attempt + 1, err)
+                if attempt >= retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            logger.info("%s %s %d total=%.1f ms server=%.1f ms sql=%s ms queries=%s (attempt %d)",
+                        method, url, response.status_code, (time.perf_counter() - start) * 1000,
+                        response.elapsed.total_seconds() * 1000, response.headers.get("X-DB-Query-Time-ms", "-"),
+                        response.headers.get("X-DB-Query-Count", "-"), attempt + 1)
+            if not should_retry(method, response, attempt, self.max_retries):
+                return response
+            time.sleep(retry_delay(attempt, response))
+            attempt += 1
 
     def _handle_request(
-            self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, token: Optional[str] = None
+            self, method: str, endpoint: str, data: Optional[Any] = None, token: Optional[str] = None
     ) -> Any:
         headers = {"Authorization": f"Bearer {token}"} if token else {}
         url = f"{self.base_url}{endpoint}"
 
         try:
-            response = requests.request(method, url, json=data, headers=headers)
+            response = self._send(method, url, data, headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as http_err:
@@ -31,6 +115,9 @@ class BackendMiddleware:
     def get_user_details(self, token: str) -> Any:
         return self._handle_request("GET", "/users/me", token=token)
 
+    def get_recommendations(self, token: str, k: int = 3) -> Any:
+        return self._handle_request("GET", f"/users/me/recommendations?k={k}", token=token)
+
     def create_product(self, token: str, name: str, price: float, stock: int, category: str, expiration_date: str) -> Any:
         data = {
             "name": name,
@@ -41,13 +128,23 @@ class BackendMiddleware:
         }
         return self._handle_request("POST", "/products", data, token)
 
-    def get_products(self, token: Optional[str] = None) -> Any:
-        return self._handle_request("GET", "/products", token=token)
+    def get_products(self, token: Optional[str] = None, skip: int = 0, limit: int = 10) -> Any:
+        return self._handle_request("GET", f"/products?skip={skip}&limit={limit}", token=token)
+
+    def get_product(self, product_id: int, token: Optional[str] = None) -> Any:
+        return self._handle_request("GET", f"/products/{product_id}", token=token)
 
     def add_to_basket(self, token: str, product_id: int, quantity: int) -> Any:
         data = {"product_id": product_id, "quantity": quantity}
         return self._handle_request("POST", "/basket/items", data, token)
 
+    # items: [{"product_id": 1, "quantity": 2}, {"name": ..., "price": ..., "expiration_date": ..., "quantity": 1}]
+    def add_many_to_basket(self, token: str, items: List[Dict[str, Any]]) -> Any:
+        return self._handle_request("POST", "/basket/items/batch", items, token)
+
+    def create_basket(self, token: str, user_id: int) -> Any:
+        return self._handle_request("POST", "/basket", {"user_id": user_id}, token)
+
     def get_basket(self, token: str) -> Any:
         return self._handle_request("GET", "/basket", token=token)
 
@@ -60,3 +157,141 @@ class BackendMiddleware:
 
     def checkout_basket(self, token: str) -> Any:
         return self._handle_request("POST", "/basket/checkout", token=token)
+
+
+# Async twin of BackendMiddleware on one httpx.AsyncClient (keep-alive
+# included), with the same timeouts, retries and logging. Use it from a
+# single event loop and close it with aclose(). The *_many helpers fetch
+# product pages or products concurrently, so a large page costs about one
+# round-trip instead of one per request.
+class AsyncBackendMiddleware:
+    def __init__(
+            self, base_url: str, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+            max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE, concurrency: int = POOL_SIZE
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _send(self, method: str, endpoint: str, data: Optional[Any], headers: Dict[str, str]) -> httpx.Response:
+        retries = self.max_retries if method in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, endpoint, json=data, headers=headers)
+            except httpx.TransportError as err:
+                logger.info("%s %s failed after %.1f ms (attempt %d): %s",
+                            method, endpoint, (time.perf_counter() - start) * 1000, attempt + 1, err)
+                if attempt >= retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            logger.info("%s %s %d total=%.1f ms sql=%s ms queries=%s (attempt %d)",
+                        method, endpoint, response.status_code, (time.perf_counter() - start) * 1000,
+                        response.headers.get("X-DB-Query-Time-ms", "-"), response.headers.get("X-DB-Query-Count", "-"),
+                        attempt + 1)
+            if not should_retry(method, response, attempt, self.max_retries):
+                return response
+            await asyncio.sleep(retry_delay(attempt, response))
+            attempt += 1
+
+    async def _handle_request(
+            self, method: str, endpoint: str, data: Optional[Any] = None, token: Optional[str] = None
+    ) -> Any:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+        try:
+            response = await self._send(method, endpoint, data, headers)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as http_err:
+            raise ValueError(f"HTTP error occurred: {http_err}") from http_err
+        except Exception as err:
+            raise ValueError(f"An error occurred: {err}") from err
+
+    async def _gather(self, calls) -> List[Any]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(call):
+            async with semaphore:
+                return await call
+
+        return await asyncio.gather(*(limited(call) for call in calls))
+
+    async def register_user(self, username: str, password: str, is_admin: int) -> Any:
+        data = {"username": username, "password": password, "is_admin": is_admin}
+        return await self._handle_request("POST", "/register", data)
+
+    async def login_user(self, username: str, password: str) -> Any:
+        data = {"username": username, "password": password}
+        return await self._handle_request("POST", "/login", data)
+
+    async def get_user_details(self, token: str) -> Any:
+        return await self._handle_request("GET", "/users/me", token=token)
+
+    async def get_recommendations(self, token: str, k: int = 3) -> Any:
+        return await self._handle_request("GET", f"/users/me/recommendations?k={k}", token=token)
+
+    async def create_product(self, token: str, name: str, price: float, stock: int, category: str, expiration_date: str) -> Any:
+        data = {
+            "name": name,
+            "price": price,
+            "stock": stock,
+            "category": category,
+            "expiration_date": expiration_date,
+        }
+        return await self._handle_request("POST", "/products", data, token)
+
+    async def get_products(self, token: Optional[str] = None, skip: int = 0, limit: int = 10) -> Any:
+        return await self._handle_request("GET", f"/products?skip={skip}&limit={limit}", token=token)
+
+    async def get_product(self, product_id: int, token: Optional[str] = None) -> Any:
+        return await self._handle_request("GET", f"/products/{product_id}", token=token)
+
+    # pages of limit products each, fetched concurrently, in page order
+    async def get_product_pages(self, pages: int, limit: int = 10, token: Optional[str] = None) -> List[Any]:
+        return await self._gather(self.get_products(token, skip=page * limit, limit=limit) for page in range(pages))
+
+    # products by id, fetched concurrently, in the order of product_ids
+    async def get_products_many(self, product_ids: List[int], token: Optional[str] = None) -> List[Any]:
+        return await self._gather(self.get_product(product_id, token) for product_id in product_ids)
+
+    async def add_to_basket(self, token: str, product_id: int, quantity: int) -> Any:
+        data = {"product_id": product_id, "quantity": quantity}
+        return await self._handle_request("POST", "/basket/items", data, token)
+
+    # items: [{"product_id": 1, "quantity": 2}, {"name": ..., "price": ..., "expiration_date": ..., "quantity": 1}]
+    async def add_many_to_basket(self, token: str, items: List[Dict[str, Any]]) -> Any:
+        return await self._handle_request("POST", "/basket/items/batch", items, token)
+
+    async def create_basket(self, token: str, user_id: int) -> Any:
+        return await self._handle_request("POST", "/basket", {"user_id": user_id}, token)
+
+    async def get_basket(self, token: str) -> Any:
+        return await self._handle_request("GET", "/basket", token=token)
+
+    async def update_basket_item(self, token: str, item_id: int, quantity: int) -> Any:
+        data = {"product_id": item_id, "quantity": quantity}
+        return await self._handle_request("PUT", f"/basket/items/{item_id}", data, token)
+
+    async def delete_basket_item(self, token: str, item_id: int) -> Any:
+        return await self._handle_request("DELETE", f"/basket/items/{item_id}", token=token)
+
+    async def checkout_basket(self, token: str) -> Any:
+        return await self._handle_request("POST", "/basket/checkout", token=token)
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect
+from models import Base
+
+# create_all() skips tables that already exist, so indexes added to models.py
+# later never reach an existing test.db. This creates the missing ones in place.
+def create_missing_indexes(bind):
+    inspector = inspect(bind)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+    return created
+
+
+if __name__ == "__main__":
+    import sys
+    from sqlalchemy import create_engine
+    from database import DATABASE_URL
+    from search import create_search_index
+
+    url = sys.argv[1] if len(sys.argv) > 1 else DATABASE_URL
+    engine = create_engine(url)
+    for name in create_missing_indexes(engine):
+        print(f"created {name}")
+    create_search_index(engine)
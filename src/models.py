@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Date
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Date, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+from datetime import datetime
 
 Base = declarative_base()
 
@@ -18,23 +20,59 @@ class Product(Base):
     name = Column(String, index=True)
     price = Column(Float, default=0)
     stock = Column(Integer, default=0)
+    category = Column(String)
     image = Column(String)
     expiration_date = Column(Date)
+
+    # exact lookups by name, price and expiration date (scanner and basket routes)
+    __table_args__ = (
+        Index("ix_products_name_price_expiration_date", "name", "price", "expiration_date"),
+        # keyset pagination ordered by expiration date
+        Index("ix_products_expiration_date", "expiration_date"),
+    )
     
 class Basket(Base):
     __tablename__ = "basket"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     quantity = Column(Integer, default=0)
     total_price = Column(Float, default=0)
+
+    items = relationship("BasketItem", back_populates="basket", cascade="all, delete-orphan")
     
 class BasketItem(Base):
     __tablename__ = "basket_items"
     
     id = Column(Integer, primary_key=True, index=True)
     basket_id = Column(Integer, ForeignKey("basket.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Integer, default=0)
     total_price = Column(Float, default=0)
-    
+
+    basket = relationship("Basket", back_populates="items")
+    product = relationship("Product")
+
+    __table_args__ = (
+        Index("ix_basket_items_basket_id_product_id", "basket_id", "product_id"),
+    )
+
+# a checked out basket
+class Order(Base):
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    quantity = Column(Integer, default=0)
+    total_price = Column(Float, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OrderLine(Base):
+    __tablename__ = "order_lines"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    quantity = Column(Integer, default=0)
+    unit_price = Column(Float, default=0)
+    total_price = Column(Float, default=0)
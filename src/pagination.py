@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import date
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+from models import User, Product, Basket
+
+# Keyset (cursor) pagination. The cursor is an opaque base64 string holding
+# the sort name plus the sort key and id of the last row of the page, so the
+# next page is a range seek on the (sort key, id) index instead of OFFSET,
+# which has to walk and throw away every skipped row.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# sortable columns per listing, each one is backed by an index
+PRODUCT_SORTS = {"id": Product.id, "name": Product.name, "expiration_date": Product.expiration_date}
+USER_SORTS = {"id": User.id, "username": User.username}
+BASKET_SORTS = {"id": Basket.id}
+
+def encode_cursor(sort: str, key, last_id: int) -> str:
+    if isinstance(key, date):
+        key = key.isoformat()
+    raw = json.dumps([sort, key, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key, last_id = json.loads(raw)
+        if key is not None and column.type.python_type is date:
+            key = date.fromisoformat(key)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort")
+    return key, last_id
+
+def sort_column(sort_columns: dict, sort: str):
+    if sort not in sort_columns:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(sort_columns)}")
+    return sort_columns[sort]
+
+# order by (sort column, id) and seek past the cursor; skip is kept for old clients
+def paginate(statement, id_column, column, sort: str, skip: int, limit: int, cursor: Optional[str]):
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort, column)
+        if column is id_column:
+            statement = statement.filter(id_column > last_id)
+        elif key is None:
+            # NULL sort keys come first in SQLite, finish those before the rest
+            statement = statement.filter(or_(and_(column.is_(None), id_column > last_id), column.isnot(None)))
+        else:
+            statement = statement.filter(tuple_(column, id_column) > tuple_(key, last_id))
+    elif skip:
+        statement = statement.offset(skip)
+    if column is id_column:
+        return statement.order_by(id_column).limit(limit)
+    return statement.order_by(column, id_column).limit(limit)
+
+# headers: a response's headers or a plain dict
+def set_next_cursor(headers, rows: list, sort: str, limit: int):
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, getattr(last, sort), last.id)
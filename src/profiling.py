@@ -0,0 +1,136 @@
+import random
+import sys
+import threading
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Optional
+
+# On-demand stack-sampling profiler for live requests, switched on by an
+# admin through /admin/profiling for a path pattern and a share of the
+# matching requests. While at least one picked request is in flight a
+# background thread samples the threads that run requests: the event loop a
+# picked request is on (async routes) and the threadpool's busy workers
+# (sync routes and dependencies). Database driver threads, the sampler and
+# anything else in the process are left out. Workers are shared by all
+# requests, so a sync route of an unpicked request running at the same
+# moment can show up too. The samples come out as collapsed stacks
+# ("outer;...;inner count"), which flamegraph.pl, speedscope and friends
+# read directly.
+#
+# When it is off the middleware costs one attribute check and no thread runs.
+
+# leaf frames of threads that are just waiting for work
+IDLE_FUNCTIONS = {"select", "poll", "wait", "epoll", "_wait_for_tstate_lock", "accept"}
+# threads anyio (and so starlette's run_in_threadpool) runs sync code on
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+class SamplingProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.route_pattern = "*"
+        self.sample_rate = 1.0
+        self.interval = 0.005
+        self.active = 0
+        # event loop thread id -> picked requests in flight on it
+        self.loop_threads = Counter()
+        self.profiled_requests = 0
+        self.samples = 0
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, route_pattern: Optional[str] = None, sample_rate: float = 1.0, interval: float = 0.005):
+        self.stop()
+        with self._lock:
+            self.route_pattern = route_pattern or "*"
+            self.sample_rate = sample_rate
+            self.interval = interval
+            self.stacks.clear()
+            self.profiled_requests = 0
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def should_profile(self, path: str) -> bool:
+        return fnmatchcase(path, self.route_pattern) and random.random() < self.sample_rate
+
+    def enter(self, thread_id: int):
+        with self._lock:
+            self.active += 1
+            self.profiled_requests += 1
+            self.loop_threads[thread_id] += 1
+
+    def exit(self, thread_id: int):
+        with self._lock:
+            self.active -= 1
+            self.loop_threads[thread_id] -= 1
+            if not self.loop_threads[thread_id]:
+                del self.loop_threads[thread_id]
+
+    def _request_threads(self) -> set:
+        with self._lock:
+            threads = set(self.loop_threads)
+        threads.update(thread.ident for thread in threading.enumerate() if thread.name == WORKER_THREAD_NAME)
+        return threads
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.active:
+                self._sample()
+
+    def _sample(self):
+        threads = self._request_threads()
+        collected = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id not in threads or frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            collected.append(";".join(reversed(stack)))
+        with self._lock:
+            self.samples += 1
+            self.stacks.update(collected)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "route_pattern": self.route_pattern,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
+
+profiler = SamplingProfiler()
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.enabled or scope["type"] != "http" or not profiler.should_profile(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        thread_id = threading.get_ident()
+        profiler.enter(thread_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.exit(thread_id)
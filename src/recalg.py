@@ -1,4 +1,8 @@
+import hashlib
+import heapq
 import json
+import os
+from collections import defaultdict
 from datetime import datetime
 
 
@@ -10,52 +14,139 @@ def addpurchasetojson(purchase, jsonfile):
     with open(jsonfile, "w") as file:
         json.dump(buff, file, indent = 4)
 
-def recalg(userfile, recipefile, favfile):
-    with open(userfile, "r") as file:
-        items = json.load(file)
-    with open(recipefile, "r") as file:
-        recipes = json.load(file)
-    for item in items['history']:
+# append a whole checkout to the history with a single rewrite of the file
+def addpurchasestojson(purchases, jsonfile):
+    with open(jsonfile, "r") as file:
+        buff = json.load(file)
+    buff['history'].extend(purchases)
+    with open(jsonfile, "w") as file:
+        json.dump(buff, file, indent = 4)
+
+# Recipe recommendations from a user's purchase history.
+#
+# A recipe scores, for every purchase of one of its ingredients, the quantity
+# bought plus 1 when the item was within EXPIRY_BONUS_DAYS of expiring on
+# REFERENCE_DATE; it is ranked by that score on top of the catalog
+# popularity in recipes.json, which is only read. RecipeScorer keeps the
+# per-user scores and how far into the history they go in a state file, so
+# a checkout only scores the purchases it added. The state is thrown away
+# and rebuilt when the recipe catalog changes or the history got shorter.
+REFERENCE_DATE = datetime(2024, 12, 13)
+EXPIRY_BONUS_DAYS = 5
+RECOMMENDED_RECIPES = 3
+
+# The catalog is parsed once and indexed by ingredient, so scoring a purchase
+# only touches the recipes that use it. It is reloaded when the file's mtime
+# or size changes, and re-indexed only if its content hash changed too.
+class RecipeCatalog:
+    def __init__(self, recipes, digest):
+        self.recipes = recipes
+        self.digest = digest
+        self.by_ingredient = defaultdict(list)
+        for index, recipe in enumerate(recipes):
+            for ingredient in set(recipe['ingredients']):
+                self.by_ingredient[ingredient].append(index)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        return cls(json.loads(raw)['recipes'], hashlib.sha256(raw).hexdigest())
+
+    def using(self, ingredient):
+        return [self.recipes[index] for index in self.by_ingredient.get(ingredient, ())]
+
+# recipefile -> ((mtime, size), RecipeCatalog)
+_catalogs = {}
+
+def load_catalog(recipefile):
+    stat = os.stat(recipefile)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _catalogs.get(recipefile)
+    if cached and cached[0] == version:
+        return cached[1]
+    with open(recipefile, "rb") as file:
+        raw = file.read()
+    if cached and cached[1].digest == hashlib.sha256(raw).hexdigest():
+        catalog = cached[1]
+    else:
+        catalog = RecipeCatalog.from_bytes(raw)
+    _catalogs[recipefile] = (version, catalog)
+    return catalog
+
+def expiry_bonus(expiration_date, today=REFERENCE_DATE):
+    difference = (expiration_date - today).days
+    return 1 if EXPIRY_BONUS_DAYS > difference > 0 else 0
+
+# points one purchase gives each recipe that uses it
+def purchase_points(item, today=REFERENCE_DATE):
+    points = item['quantity']
+    # expiration date is dd/mm/yyyy
+    if item.get('expiration_date'):
+        points += expiry_bonus(datetime.strptime(item['expiration_date'], "%d/%m/%Y"), today)
+    return points
+
+# scores from the whole history, the way recalg used to count them
+def recompute_scores(history, recipes):
+    scores = {recipe['name']: 0 for recipe in recipes}
+    for item in history:
         if not item:
             continue
-        for recipe in recipes['recipes']:
+        for recipe in recipes:
             if item['name'] in recipe['ingredients']:
-                recipe['popularity'] += item['quantity']
-                # add an extra popularity for soon to expire items ( less than a week )
-                # expiration date is dd/mm/yyyy
-                string_current_date = "13/12/2024"
-                string_expiration_date = item['expiration_date']
-                if string_expiration_date:
-                    print(string_expiration_date)
-
-                    expiration_date = datetime.strptime(string_expiration_date, "%d/%m/%Y")
-                    current_date = datetime.strptime(string_current_date, "%d/%m/%Y")
-
-                    # Calculate the difference in days
-                    difference = (expiration_date - current_date).days
-
-                    # Check if the difference is less than 5 days
-                    if 5 > difference > 0:
-                        print("mooore")
-                        recipe['popularity'] += 1
-
-
-    #
-    recipe1 = recipes['recipes'][0]
-    recipe2 = recipes['recipes'][1]
-    recipe3 = recipes['recipes'][2]
-
-    for recipe in recipes['recipes']:
-        if recipe['popularity'] > recipe1['popularity']:
-            recipe3 = recipe2
-            recipe2 = recipe1
-            recipe1 = recipe
-        elif recipe['popularity'] > recipe2['popularity']:
-            recipe3 = recipe2
-            recipe2 = recipe
-        elif recipe['popularity'] > recipe3['popularity']:
-            recipe3 = recipe
-    with open(recipefile, "w") as file:
-        json.dump(recipes, file, indent = 4)
+                scores[recipe['name']] += purchase_points(item)
+    return scores
+
+def scores_path(userfile):
+    directory, name = os.path.split(userfile)
+    return os.path.join(directory, f"scores_{name}")
+
+class RecipeScorer:
+    def __init__(self, catalog, scores=None, applied=0):
+        self.catalog = catalog
+        self.scores = scores if scores is not None else {recipe['name']: 0 for recipe in catalog.recipes}
+        # number of history entries already in the scores
+        self.applied = applied
+
+    @classmethod
+    def load(cls, statefile, catalog):
+        if os.path.exists(statefile):
+            with open(statefile, "r") as file:
+                state = json.load(file)
+            if state.get('catalog') == catalog.digest:
+                return cls(catalog, state['scores'], state['applied'])
+        return cls(catalog)
+
+    def save(self, statefile):
+        with open(statefile, "w") as file:
+            json.dump({"catalog": self.catalog.digest, "applied": self.applied, "scores": self.scores}, file)
+
+    def apply(self, history):
+        if len(history) < self.applied:
+            self.scores = {recipe['name']: 0 for recipe in self.catalog.recipes}
+            self.applied = 0
+        for item in history[self.applied:]:
+            if not item:
+                continue
+            self.add(item['name'], purchase_points(item))
+        self.applied = len(history)
+
+    def add(self, ingredient, points):
+        for recipe in self.catalog.using(ingredient):
+            self.scores[recipe['name']] += points
+
+    def score(self, recipe):
+        return recipe['popularity'] + self.scores.get(recipe['name'], 0)
+
+    # best k recipes, each with its total score as popularity; ties keep catalog order
+    def top(self, k=RECOMMENDED_RECIPES):
+        best = heapq.nlargest(k, self.catalog.recipes, key=self.score)
+        return [{**recipe, 'popularity': self.score(recipe)} for recipe in best]
+
+def recalg(userfile, recipefile, favfile, statefile=None):
+    with open(userfile, "r") as file:
+        items = json.load(file)
+    statefile = statefile or scores_path(userfile)
+    scorer = RecipeScorer.load(statefile, load_catalog(recipefile))
+    scorer.apply(items['history'])
+    scorer.save(statefile)
     with open(favfile, "w") as file:
-        json.dump({"recipes": [recipe1, recipe2, recipe3]}, file, indent = 4)
\ No newline at end of file
+        json.dump({"recipes": scorer.top()}, file, indent = 4)
@@ -0,0 +1,71 @@
+import os
+import threading
+from datetime import date, datetime, time
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import Order, OrderLine, Product
+from recalg import RecipeScorer, expiry_bonus, load_catalog
+from cache import TTLCache
+
+# Recipe recommendations from a user's checked-out orders, scored the same
+# way as recalg over recipes.json. Order lines are summed per product in the
+# query, so scoring costs one pass over the distinct products the user
+# bought, and the top k come from a heap. The near-expiry bonus counts from
+# today, not recalg's fixed REFERENCE_DATE. Results are cached per user until
+# that user's next checkout or the end of the day.
+
+RECIPES_FILE = os.getenv("RECIPES_FILE", "recipes.json")
+RECOMMENDATION_CACHE_SIZE = 4096
+RECOMMENDATION_CACHE_TTL = 3600
+
+# user id -> {k: recommendations}
+recommendation_cache = TTLCache(maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL)
+
+# user id -> checkouts seen; a result computed across a checkout isn't stored
+_generations = {}
+_generations_lock = threading.Lock()
+
+def invalidate_recommendations(user_id: int):
+    with _generations_lock:
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+        recommendation_cache.pop(user_id)
+
+def _purchases_statement(user_id: int):
+    return (
+        select(Product.name, Product.expiration_date, func.sum(OrderLine.quantity), func.count(OrderLine.id))
+        .join(OrderLine, OrderLine.product_id == Product.id)
+        .join(Order, Order.id == OrderLine.order_id)
+        .where(Order.user_id == user_id)
+        .group_by(Product.id)
+    )
+
+def recommend_recipes(db: Session, user_id: int, k: int) -> list:
+    # the catalog and the day are part of the key: editing recipes.json makes
+    # old entries stale, and so does a product getting close to its expiry
+    catalog = load_catalog(RECIPES_FILE)
+    today = date.today()
+    cached = recommendation_cache.get(user_id)
+    if cached is not None and cached["catalog"] == catalog.digest and cached["day"] == today and k in cached["top"]:
+        return cached["top"][k]
+    generation = _generations.get(user_id, 0)
+
+    midnight = datetime.combine(today, time())
+    scorer = RecipeScorer(catalog)
+    for name, expiration_date, quantity, lines in db.execute(_purchases_statement(user_id)):
+        bonus = expiry_bonus(datetime.combine(expiration_date, time()), midnight) * lines if expiration_date else 0
+        scorer.add(name, quantity + bonus)
+    top = [
+        {"name": recipe["name"], "ingredients": recipe["ingredients"], "instructions": recipe["instructions"], "score": recipe["popularity"]}
+        for recipe in scorer.top(k)
+    ]
+
+    with _generations_lock:
+        # the user checked out while this was computed: the orders read may predate it
+        if _generations.get(user_id, 0) != generation:
+            return top
+        cached = recommendation_cache.get(user_id)
+        if cached is None or cached["catalog"] != catalog.digest or cached["day"] != today:
+            cached = {"catalog": catalog.digest, "day": today, "top": {}}
+            recommendation_cache.set(user_id, cached)
+        cached["top"][k] = top
+    return top
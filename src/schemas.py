@@ -0,0 +1,121 @@
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Optional
+from datetime import date
+
+class UserOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    is_admin: int
+
+class RecipeRecommendation(BaseModel):
+    name: str
+    ingredients: list[str]
+    instructions: str
+    score: float
+
+class ProductOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: Optional[str] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    category: Optional[str] = None
+    image: Optional[str] = None
+    expiration_date: Optional[date] = None
+
+# bm25 score from the full-text index, lower is a better match
+class ProductSearchResult(ProductOut):
+    score: float
+
+class BasketOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: Optional[int] = None
+    quantity: int = 0
+    total_price: float = 0
+
+class BasketItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    basket_id: Optional[int] = None
+    product_id: Optional[int] = None
+    quantity: int = 0
+    total_price: float = 0
+
+class BasketWithItemsOut(BaseModel):
+    basket: BasketOut
+    items: list[BasketItemOut]
+
+class UserCreate(BaseModel):
+    username: str
+    password: str
+    is_admin: int
+    
+class LoginRequest(BaseModel):
+    username: str
+    password: str
+    
+class ProductCreate(BaseModel):
+    name: str
+    price: float
+    stock: int
+    category: str
+    expiration_date: date
+    
+# one line of a /products/import file; image is kept on update when left out
+class ProductImportRow(ProductCreate):
+    image: Optional[str] = None
+
+class ProductUpdate(BaseModel):
+    name: str
+    price: float
+    stock: int
+    category: str
+    expiration_date: date
+    
+class BasketCreate(BaseModel):
+    user_id: int
+    
+class BasketUpdate(BaseModel):
+    user_id: int
+
+class BasketItemCreate(BaseModel):
+    product_id: int
+    quantity: int
+
+class BasketItemUpdate(BaseModel):
+    product_id: int
+    quantity: int
+    
+class StockUpdate(BaseModel):
+    stock: int
+    
+class BasketItemRequest(BaseModel):
+    quantity: int
+
+# one line of a batch: either product_id or name + price + expiration_date
+class BasketBatchItem(BaseModel):
+    product_id: Optional[int] = None
+    name: Optional[str] = None
+    price: Optional[float] = None
+    expiration_date: Optional[date] = None
+    quantity: int
+
+    @model_validator(mode="after")
+    def check_product_reference(self):
+        if self.product_id is None and (self.name is None or self.price is None or self.expiration_date is None):
+            raise ValueError("either product_id or name, price and expiration_date is required")
+        if self.quantity <= 0:
+            raise ValueError("quantity must be positive")
+        return self
+
+class ProfilingConfig(BaseModel):
+    # fnmatch pattern on the request path, e.g. "/basket/items/*"
+    route: Optional[str] = None
+    sample_rate: float = Field(1.0, gt=0, le=1)
+    interval_ms: float = Field(5, gt=0)
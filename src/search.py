@@ -0,0 +1,67 @@
+import re
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+# Full-text product search on an SQLite FTS5 index over products.name and
+# products.category. The index is an external-content table: it stores only
+# the token index and reads the columns back from products, and triggers on
+# products keep it in sync. Stock and price updates don't touch the index.
+
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, category,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO products_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    # a name hit outranks a category hit; setting it as the table's rank lets
+    # ORDER BY rank use FTS5's optimized top-k path
+    "INSERT INTO products_fts(products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+]
+
+SEARCH_QUERY = text("""
+    SELECT p.id, p.name, p.price, p.stock, p.category, p.image, p.expiration_date, products_fts.rank AS score
+    FROM products_fts JOIN products p ON p.id = products_fts.rowid
+    WHERE products_fts MATCH :query
+    ORDER BY products_fts.rank
+    LIMIT :limit
+""")
+
+# create the index and triggers; a newly created index is filled from the
+# rows already in products
+def create_search_index(bind):
+    if bind.dialect.name != "sqlite":
+        return
+    exists = inspect(bind).has_table("products_fts")
+    with bind.begin() as connection:
+        for statement in SEARCH_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+
+# every word must match, the last one as a prefix so results show while typing;
+# words are quoted so user input can't inject FTS5 query syntax
+def match_expression(q: str) -> str:
+    words = re.findall(r"\w+", q)
+    if not words:
+        return ""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def search_products(db: Session, q: str, limit: int = 20) -> list:
+    query = match_expression(q)
+    if not query:
+        return []
+    rows = db.execute(SEARCH_QUERY, {"query": query, "limit": limit}).all()
+    return [row._asdict() for row in rows]
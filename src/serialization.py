@@ -0,0 +1,23 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+from models import User, Product, Basket, BasketItem
+
+# Column tuples for the list routes. Selecting plain columns skips building
+# ORM objects, and the rows go to orjson as dicts instead of through
+# jsonable_encoder's per-attribute introspection.
+USER_COLUMNS = (User.id, User.username, User.is_admin)
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.price, Product.stock, Product.category, Product.image, Product.expiration_date)
+BASKET_COLUMNS = (Basket.id, Basket.user_id, Basket.quantity, Basket.total_price)
+BASKET_ITEM_COLUMNS = (BasketItem.id, BasketItem.basket_id, BasketItem.product_id, BasketItem.quantity, BasketItem.total_price)
+
+def rows_to_dicts(rows) -> list:
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content)
+
+def rows_response(rows, headers: dict = None) -> ORJSONResponse:
+    return ORJSONResponse(rows_to_dicts(rows), headers=headers)
@@ -0,0 +1,30 @@
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import Product
+
+# Stock changes are done as single conditional UPDATEs instead of
+# read / compare in Python / write back, so concurrent checkouts can't
+# oversell and the SQLite write lock is only taken by the UPDATE itself.
+
+def reserve_stock_statement(product_id: int, quantity: int):
+    return (
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+def release_stock_statement(product_id: int, quantity: int):
+    return (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock=Product.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+# False when the product is missing or has less than quantity in stock
+def reserve_stock(db: Session, product_id: int, quantity: int) -> bool:
+    return db.execute(reserve_stock_statement(product_id, quantity)).rowcount == 1
+
+def release_stock(db: Session, product_id: int, quantity: int) -> bool:
+    return db.execute(release_stock_statement(product_id, quantity)).rowcount == 1